@@ -0,0 +1,212 @@
+"""A terminal backend that writes ANSI escape sequences instead of using
+curses.
+
+The windows write in a buffer of the whole screen. doupdate compares it
+with what the terminal shows and sends only the cells that changed, with
+a cursor movement before every run of changed cells and an SGR sequence
+when the attribute changes. A frame is sent with a single write.
+"""
+
+import os
+import select
+import shutil
+import sys
+import termios
+import tty
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+# SGR parameters of the colours of the tetrominoes, "" is the default
+COLORS: Dict[str, str] = {
+    "!": "2",
+    ".": "2",
+    "C": "1;36",
+    "B": "1;34",
+    "O": "1;37",
+    "Y": "1;33",
+    "G": "1;32",
+    "P": "1;35",
+    "R": "1;31",
+}
+
+# Keys that are sent as escape sequences, with the names curses uses
+_KEYS = {
+    b"\x1b[A": "KEY_UP",
+    b"\x1b[B": "KEY_DOWN",
+    b"\x1b[C": "KEY_RIGHT",
+    b"\x1b[D": "KEY_LEFT",
+    b"\x1bOA": "KEY_UP",
+    b"\x1bOB": "KEY_DOWN",
+    b"\x1bOC": "KEY_RIGHT",
+    b"\x1bOD": "KEY_LEFT",
+}
+
+# Rewriting a few unchanged cells is cheaper than moving the cursor
+_MAX_GAP = 3
+
+
+class AnsiWindow:
+    """A rectangle of the screen with the methods of a curses window
+    that render.WindowRenderer uses"""
+
+    def __init__(self, screen: "AnsiScreen", nlines: int, ncols: int, y: int, x: int):
+        self._screen = screen
+        self._nlines, self._ncols = nlines, ncols
+        self._y, self._x = y, x
+        self._cursor = (0, 0)
+
+    def getmaxyx(self) -> Tuple[int, int]:
+        return self._nlines, self._ncols
+
+    def addstr(self, row: int, col: int, text: str, attr: str = "") -> None:
+        """Write text at row and col of the window, text that doesn't fit
+        is cut off"""
+        if not 0 <= row < self._nlines:
+            return
+        self._screen.put(self._y + row, self._x + col, text[: self._ncols - col], attr)
+
+    def move(self, row: int, col: int) -> None:
+        self._cursor = (row, col)
+
+    def clrtoeol(self) -> None:
+        row, col = self._cursor
+        self.addstr(row, col, " " * (self._ncols - col))
+
+    def erase(self) -> None:
+        for row in range(self._nlines):
+            self.addstr(row, 0, " " * self._ncols)
+
+    def noutrefresh(self) -> None:
+        """The changes are already in the buffer of the screen"""
+
+    def refresh(self) -> None:
+        self._screen.doupdate()
+
+
+class AnsiScreen(AnsiWindow):
+    """The whole terminal, it also reads the keys"""
+
+    def __init__(self, infd: int, outfd: int):
+        # like curses, fall back to LINES and COLUMNS or 80 * 24
+        ncols, nlines = shutil.get_terminal_size()
+        super().__init__(self, nlines, ncols, 0, 0)
+        self._infd, self._outfd = infd, outfd
+        # What the terminal shows and what it should show
+        self._shown = [[(" ", "")] * ncols for _ in range(nlines)]
+        self._cells = [row.copy() for row in self._shown]
+        self._dirty: Set[int] = set()
+        self._timeout: Optional[float] = None
+        self._input = b""
+        self._sgr = ""  # the attribute the terminal is set to
+        self._saved_mode: Optional[list] = None
+        self.bytes_written = 0
+        self.writes = 0
+
+    def start(self) -> None:
+        """Switch the terminal to cbreak mode and the alternate screen"""
+        self._saved_mode = termios.tcgetattr(self._infd)
+        tty.setcbreak(self._infd)
+        self._write("\x1b[?1049h\x1b[?25l\x1b[0m\x1b[2J")
+
+    def stop(self) -> None:
+        """Restore the terminal"""
+        self._write("\x1b[0m\x1b[?25h\x1b[?1049l")
+        if self._saved_mode is not None:
+            termios.tcsetattr(self._infd, termios.TCSADRAIN, self._saved_mode)
+
+    def newwin(self, nlines: int, ncols: int, y: int = 0, x: int = 0) -> AnsiWindow:
+        """A window like curses.newwin"""
+        return AnsiWindow(self, nlines, ncols, y, x)
+
+    def put(self, row: int, col: int, text: str, attr: str) -> None:
+        """Store text in the buffer, cells outside the screen are dropped"""
+        if not 0 <= row < self._nlines:
+            return
+        attr = attr or ""  # curses uses 0 for the default
+        cells = self._cells[row]
+        for index, char in enumerate(text[: max(0, self._ncols - col)], col):
+            cells[index] = (char, attr)
+        self._dirty.add(row)
+
+    def doupdate(self) -> None:
+        """Send the changed cells to the terminal with one write"""
+        out: List[str] = []
+        cursor = None  # unknown after the previous frame
+        sgr = self._sgr
+        for row in sorted(self._dirty):
+            cells, shown = self._cells[row], self._shown[row]
+            if cells == shown:
+                continue
+            col = 0
+            while col < self._ncols:
+                if cells[col] == shown[col]:
+                    col += 1
+                    continue
+                # A run of changed cells, with small unchanged gaps
+                end = col + 1
+                gap = 0
+                while end < self._ncols and gap <= _MAX_GAP:
+                    if cells[end] == shown[end]:
+                        gap += 1
+                    else:
+                        gap = 0
+                    end += 1
+                end -= gap
+                if cursor != (row, col):
+                    out.append(f"\x1b[{row + 1};{col + 1}H")
+                for char, attr in cells[col:end]:
+                    if attr != sgr:
+                        out.append(f"\x1b[0;{attr}m" if attr else "\x1b[0m")
+                        sgr = attr
+                    out.append(char)
+                shown[col:end] = cells[col:end]
+                cursor = (row, end)
+                col = end
+        self._dirty.clear()
+        self._sgr = sgr
+        if out:
+            self._write("".join(out))
+
+    def _write(self, text: str) -> None:
+        data = text.encode()
+        while data:
+            written = os.write(self._outfd, data)
+            self.bytes_written += written
+            self.writes += 1
+            data = data[written:]
+
+    def timeout(self, delay: int) -> None:
+        """Like the curses timeout: block when delay is negative, else
+        wait at most delay milliseconds for a key"""
+        self._timeout = None if delay < 0 else delay / 1000
+
+    def getkey(self) -> Optional[str]:
+        """The next key, or None when no key was pressed in time. Arrow
+        keys get the curses names, like KEY_LEFT."""
+        if not self._input:
+            ready, _, _ = select.select([self._infd], [], [], self._timeout)
+            if not ready:
+                return None
+            self._input = os.read(self._infd, 1024)
+            if not self._input:
+                return None
+        for sequence, name in _KEYS.items():
+            if self._input.startswith(sequence):
+                self._input = self._input[len(sequence) :]
+                return name
+        # One utf-8 character
+        length = 1
+        while length < len(self._input) and self._input[length] & 0xC0 == 0x80:
+            length += 1
+        key, self._input = self._input[:length], self._input[length:]
+        return key.decode(errors="replace")
+
+
+def wrapper(func: Callable, *args):
+    """Like curses.wrapper, func is called with the screen and args and
+    the terminal is restored afterwards"""
+    screen = AnsiScreen(sys.stdin.fileno(), sys.stdout.fileno())
+    screen.start()
+    try:
+        return func(screen, *args)
+    finally:
+        screen.stop()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""An archive of many recorded games of Tetᴙis in fixed width columns.
+
+The file starts with a header holding the number of games and the
+offset and length of every column. A column is an array of one integer
+type, so it is read by casting a slice of the memory mapped file, and
+every value is reached without parsing what comes before it. There are
+columns per game (seed, size, result), per input (frame, action), per
+lock (frame, score, lines) and per row of the board after every lock.
+The *_start columns are the index: entry n holds where the inputs, locks
+and rows of game n start, entry n + 1 where they end. The integers are
+in the byte order of the machine, little endian on all common ones.
+"""
+
+import argparse as ap
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import time
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import replay
+from replay import Recording
+from tetris import Action, Events, Tetris
+
+_MAGIC = b"ATA1"
+_HEADER = struct.Struct("<4sQ")  # magic, number of games
+_COLUMN = struct.Struct("<QQ")  # offset, number of values
+_ALIGN = 8
+
+# The columns in the order of the file, with their array type codes
+_COLUMNS = (
+    ("seed", "Q"),
+    ("style", "B"),  # index in Tetris.styles
+    ("width", "H"),
+    ("height", "H"),
+    ("frames", "I"),
+    ("score", "I"),
+    ("lines", "I"),
+    ("checksum", "I"),
+    ("input_start", "Q"),
+    ("lock_start", "Q"),
+    ("row_start", "Q"),
+    ("input_frame", "I"),
+    ("input_action", "B"),
+    ("lock_frame", "I"),
+    ("lock_score", "I"),
+    ("lock_lines", "I"),
+    ("rows", "Q"),  # bitmasks like Tetris.rows, hence at most 64 columns
+)
+_TYPES = dict(_COLUMNS)
+
+
+class Lock(NamedTuple):
+    """The state of a game right after a tetrominoe locked"""
+
+    frame: int
+    score: int
+    lines: int
+    rows: Tuple[int, ...]
+
+
+class ArchiveWriter:
+    """Collects games and writes the archive when it is closed. The
+    columns are spooled to temporary files, so the games don't have to
+    fit in memory."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        folder = os.path.dirname(os.path.abspath(filename))
+        self._files = {name: tempfile.TemporaryFile(dir=folder) for name, _ in _COLUMNS}
+        self._counts = dict.fromkeys(self._files, 0)
+        self._ends = {"input_start": 0, "lock_start": 0, "row_start": 0}
+        for name in self._ends:
+            self._write(name, [0])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *_exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self._discard()
+
+    def __len__(self) -> int:
+        return self._counts["seed"]
+
+    def _write(self, name: str, values) -> None:
+        data = array(_TYPES[name], values)
+        self._files[name].write(data.tobytes())
+        self._counts[name] += len(data)
+
+    def add(self, recording: Recording) -> None:
+        """Replay a recording to find its locks and add the game"""
+        if recording.width > 64:
+            raise ValueError("Only boards of at most 64 columns can be archived")
+        locks = _replay_locks(recording)
+        for name, value in (
+            ("seed", recording.seed),
+            ("style", Tetris.styles.index(recording.style)),
+            ("width", recording.width),
+            ("height", recording.height),
+            ("frames", recording.frames),
+            ("score", recording.score),
+            ("lines", recording.lines),
+            ("checksum", recording.checksum),
+        ):
+            self._write(name, [value])
+        self._write("input_frame", [frame for frame, _ in recording.inputs])
+        self._write("input_action", [action for _, action in recording.inputs])
+        self._write("lock_frame", [lock.frame for lock in locks])
+        self._write("lock_score", [lock.score for lock in locks])
+        self._write("lock_lines", [lock.lines for lock in locks])
+        self._write("rows", [row for lock in locks for row in lock.rows])
+        self._ends["input_start"] += len(recording.inputs)
+        self._ends["lock_start"] += len(locks)
+        self._ends["row_start"] += len(locks) * recording.height
+        for name, end in self._ends.items():
+            self._write(name, [end])
+
+    def close(self) -> None:
+        """Write the header followed by the columns"""
+        offset = _HEADER.size + _COLUMN.size * len(_COLUMNS)
+        table = []
+        for name, code in _COLUMNS:
+            offset += -offset % _ALIGN
+            table.append((offset, self._counts[name]))
+            offset += self._counts[name] * array(code).itemsize
+        with open(self.filename, "wb") as outfile:
+            outfile.write(_HEADER.pack(_MAGIC, len(self)))
+            for entry in table:
+                outfile.write(_COLUMN.pack(*entry))
+            for (name, _), (start, _) in zip(_COLUMNS, table):
+                outfile.write(bytes(start - outfile.tell()))
+                column = self._files[name]
+                column.seek(0)
+                shutil.copyfileobj(column, outfile)
+        self._discard()
+
+    def _discard(self) -> None:
+        for column in self._files.values():
+            column.close()
+
+
+def _replay_locks(recording: Recording) -> List[Lock]:
+    """Replay a recording and note every lock"""
+    locks = []
+
+    def note(tgame: Tetris, events: Events) -> None:
+        if events.locked:
+            locks.append(Lock(tgame.frames, tgame.score, tgame.lines, tgame.rows))
+
+    replay.replay(recording, on_events=note)
+    return locks
+
+
+class Archive:
+    """Read access to an archive through a memory map. The columns are
+    memoryviews, e.g. archive.columns["score"][n] is the score of game
+    n."""
+
+    def __init__(self, filename: str):
+        with open(filename, "rb") as infile:
+            self._mmap = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        magic, self._num_games = _HEADER.unpack_from(self._view)
+        if magic != _MAGIC:
+            self.close()
+            raise ValueError(f"{filename} isn't an archive of ascii-tetris")
+        self.columns: Dict[str, memoryview] = {}
+        for index, (name, code) in enumerate(_COLUMNS):
+            offset, count = _COLUMN.unpack_from(
+                self._view, _HEADER.size + index * _COLUMN.size
+            )
+            size = count * array(code).itemsize
+            self.columns[name] = self._view[offset : offset + size].cast(code)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._num_games
+
+    def close(self) -> None:
+        """Release the memory map, the columns can't be used afterwards"""
+        for column in getattr(self, "columns", {}).values():
+            column.release()
+        self._view.release()
+        self._mmap.close()
+
+    def _range(self, name: str, game: int) -> Tuple[int, int]:
+        """Where the values of a game start and end in the columns that
+        the index column name points into"""
+        index = self.columns[name]
+        return index[game], index[game + 1]
+
+    def recording(self, game: int, stop: Optional[int] = None) -> Recording:
+        """The recording of a game, it can be replayed by replay.replay.
+        With stop only the inputs up to that frame are read."""
+        columns = self.columns
+        start, end = self._range("input_start", game)
+        frames, actions = columns["input_frame"], columns["input_action"]
+        if stop is not None:
+            end = bisect_right(frames, stop, start, end)
+        return Recording(
+            Tetris.styles[columns["style"][game]],
+            columns["seed"][game],
+            columns["width"][game],
+            columns["height"][game],
+            [(frames[i], Action(actions[i])) for i in range(start, end)],
+            columns["frames"][game],
+            columns["score"][game],
+            columns["lines"][game],
+            columns["checksum"][game],
+        )
+
+    def num_locks(self, game: int) -> int:
+        start, end = self._range("lock_start", game)
+        return end - start
+
+    def lock(self, game: int, index: int) -> Lock:
+        """The state of a game after its index-th lock"""
+        start, end = self._range("lock_start", game)
+        if not 0 <= index < end - start:
+            raise IndexError("lock index out of range")
+        columns = self.columns
+        height = columns["height"][game]
+        row = columns["row_start"][game] + index * height
+        return Lock(
+            columns["lock_frame"][start + index],
+            columns["lock_score"][start + index],
+            columns["lock_lines"][start + index],
+            tuple(columns["rows"][row : row + height]),
+        )
+
+    def lock_at(self, game: int, frame: int) -> Optional[Lock]:
+        """The state after the last lock at or before a frame, None when
+        nothing had locked yet"""
+        start, end = self._range("lock_start", game)
+        index = bisect_right(self.columns["lock_frame"], frame, start, end) - start
+        return self.lock(game, index - 1) if index else None
+
+    def replay_to(self, game: int, frame: int) -> Tetris:
+        """The game after a number of frames and the inputs of that frame,
+        only the inputs up to that frame are read"""
+        return replay.replay(self.recording(game, frame), frame)
+
+
+def _range_stats(job: Tuple[str, int, int]) -> Dict[str, int]:
+    """Sums and maxima over a range of games. Runs in a worker process."""
+    filename, first, last = job
+    with Archive(filename) as archive:
+        columns = archive.columns
+        stats = {
+            "games": last - first,
+            "frames": sum(columns["frames"][first:last]),
+            "score": sum(columns["score"][first:last]),
+            "max_score": max(columns["score"][first:last], default=0),
+            "lines": sum(columns["lines"][first:last]),
+            "inputs": columns["input_start"][last] - columns["input_start"][first],
+            "locks": columns["lock_start"][last] - columns["lock_start"][first],
+            "tetrises": 0,
+            "stack_height": 0,  # summed over all locks
+        }
+        lock_lines, rows = columns["lock_lines"], columns["rows"]
+        for game in range(first, last):
+            height = columns["height"][game]
+            start, end = archive._range("lock_start", game)
+            row = columns["row_start"][game]
+            lines = 0
+            for index in range(start, end):
+                if lock_lines[index] - lines == 4:
+                    stats["tetrises"] += 1
+                lines = lock_lines[index]
+                empty = 0
+                while empty < height and not rows[row + empty]:
+                    empty += 1
+                stats["stack_height"] += height - empty
+                row += height
+    return stats
+
+
+def archive_stats(
+    filename: str, workers: Optional[int] = None, chunk: int = 1000
+) -> Dict[str, float]:
+    """Aggregate statistics of all games of an archive, computed by a
+    pool of worker processes that each map the archive"""
+    with Archive(filename) as archive:
+        num_games = len(archive)
+    jobs = [
+        (filename, first, min(first + chunk, num_games))
+        for first in range(0, num_games, chunk)
+    ]
+    totals: Dict[str, float] = {"games": 0}
+    with ProcessPoolExecutor(workers or os.cpu_count() or 1) as pool:
+        for stats in pool.map(_range_stats, jobs):
+            for key, value in stats.items():
+                if key.startswith("max_"):
+                    totals[key] = max(totals.get(key, 0), value)
+                else:
+                    totals[key] = totals.get(key, 0) + value
+    if totals["games"]:
+        totals["mean_score"] = totals["score"] / totals["games"]
+        totals["mean_lines"] = totals["lines"] / totals["games"]
+    if totals.get("locks"):
+        totals["mean_stack_height"] = totals.pop("stack_height") / totals["locks"]
+    return totals
+
+
+def main():
+    """Pack recordings in an archive or compute statistics of one"""
+    cmdparser = ap.ArgumentParser(
+        "archive", "Store many recorded games of Tetᴙis and analyse them"
+    )
+    commands = cmdparser.add_subparsers(dest="command", required=True)
+    pack = commands.add_parser("pack", help="write recordings to an archive")
+    pack.add_argument("archive", help="the archive to write")
+    pack.add_argument("recordings", nargs="*", help="recording files to add")
+    pack.add_argument(
+        "--random", type=int, default=0, help="also add this many random games"
+    )
+    pack.add_argument(
+        "--seed", type=int, default=0, help="seed of the first random game"
+    )
+    stats = commands.add_parser("stats", help="statistics of all games of an archive")
+    stats.add_argument("archive", help="the archive to read")
+    stats.add_argument(
+        "-w", "--workers", type=int, help="number of processes, defaults to all cores"
+    )
+    args = cmdparser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "pack":
+        with ArchiveWriter(args.archive) as writer:
+            for filename in args.recordings:
+                writer.add(replay.load(filename))
+            for seed in range(args.seed, args.seed + args.random):
+                writer.add(replay.random_recording(seed))
+            num_games = len(writer)
+    else:
+        totals = archive_stats(args.archive, args.workers)
+        for key, value in totals.items():
+            print(f"{key} = {value:g}")
+        num_games = totals["games"]
+    duration = time.perf_counter() - start
+    print(f"duration = {duration:.3f}s")
+    print(f"games/s = {num_games / duration:.1f}")
+
+
+if __name__ == "__main__":
+    main()
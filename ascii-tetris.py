@@ -1,143 +1,286 @@
 #!/usr/bin/env python3
 """Play Tetᴙis in ascii-style"""
 
-import copy
+import time
+
+# Taken before the other imports, used by --startup-benchmark
+_START = time.perf_counter()
+
 import curses
 import argparse as ap
+import math
+import random
 import sys
-from typing import Dict
-import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
 import logging
 
-from config import ConfigFile
-from tetris import Tetris, LINE, MEL, EL, CUBE, MES, TABLE, ES
+from autoshift import AutoShift
+from render import WindowRenderer
+from scheduler import FrameScheduler, GC_MODES, gc_mode
+from speed import load_curve
+from tetris import (
+    Action,
+    Tetris,
+    DEFAULT_HEIGHT,
+    DEFAULT_WIDTH,
+    GHOST,
+    LINE,
+    MEL,
+    EL,
+    CUBE,
+    MES,
+    TABLE,
+    ES,
+)
+
+# Modules that aren't needed for the first frame are imported when used
+if TYPE_CHECKING:
+    from bot import Bot
+    from profiling import FrameProfile
+    from replay import Recorder
+    from scores import HighScores
+    from undo import UndoHistory
+    from versus import Peer
 
 
 # Dict that maps a letter to a terminal color
-COLOR_PAIRS: Dict[str, int] = {"!": curses.A_DIM}
+COLOR_PAIRS: Dict[str, int] = {"!": curses.A_DIM, GHOST: curses.A_DIM}
 
 # Store config info
 _config = None
+# The leaderboard
+_scores = None
+# Seconds from the start of this script until the first frame was shown
+_time_to_first_frame = None
 
+# Scores that make it into the top are asked for a player name
+_TOP_N = 10
 
-def _draw_in_color(stdscr, tgame: Tetris) -> None:
-    """Draw the TetrisGame in color"""
-    strrep = str(tgame)
+# Where versus mode listens by default
+_VERSUS_ADDRESS = "localhost:7373"
 
-    for row, line in enumerate(strrep.split("\n")):
-        for col, char in enumerate(line):
-            try:
-                stdscr.addstr(row, col, char, COLOR_PAIRS[char])
-            except KeyError:
-                stdscr.addstr(
-                    row, col, char, curses.color_pair(0)
-                )  # default color pair
 
+def _get_config() -> dict:
+    """Read the config file the first time it is needed"""
+    global _config
+    if _config is None:
+        from config import ConfigFile
 
-def _game_loop(args, tgame: Tetris, stdscr, win, next_win=None, score_win=None) -> None:
+        _config = ConfigFile().read()
+    return _config
+
+
+def _get_scores() -> "HighScores":
+    """Open the leaderboard the first time it is needed"""
+    global _scores
+    if _scores is None:
+        from scores import HighScores
+
+        _scores = HighScores()
+        _scores.import_config(_get_config())
+    return _scores
+
+
+def _game_loop(
+    args,
+    tgame: Tetris,
+    stdscr,
+    win,
+    next_win=None,
+    score_win=None,
+    recorder: Optional["Recorder"] = None,
+    bot: Optional["Bot"] = None,
+    profile: Optional["FrameProfile"] = None,
+    peer: Optional["Peer"] = None,
+    opponent_win=None,
+    history: Optional["UndoHistory"] = None,
+    doupdate: Callable[[], None] = curses.doupdate,
+) -> FrameScheduler:
     """Runs the game loop until the user exits the game or
-    is game over."""
-    global _config
+    is game over. The game advances in whole NES frames, the returned
+    scheduler has the timing statistics. When a profile is given, the
+    durations of the phases of every frame are added to it. In versus
+    mode the game is sent to the peer after every change and the game
+    also ends when the opponent's game is over. With a history, u takes
+    back the previous tetrominoe. All pending keys are read at once and
+    held left and right keys shift on the frames of the NES auto shift.
+    doupdate shows the changes of all windows."""
     ACTIONS = {
-        "KEY_LEFT": tgame.move_left,
-        "KEY_RIGHT": tgame.move_right,
-        "KEY_DOWN": tgame.increment,
-        "KEY_UP": tgame.rotate,
-        "q": tgame.set_game_over,
-        " ": tgame.drop,
+        "KEY_LEFT": Action.LEFT,
+        "KEY_RIGHT": Action.RIGHT,
+        "KEY_DOWN": Action.DOWN,
+        "KEY_UP": Action.ROTATE,
+        "q": Action.QUIT,
+        " ": Action.DROP,
     }
-    start = time.time()
-    running_time_inc = start
+    # getkey refreshes stdscr when it is dirty, which would wipe the
+    # windows below, so get that over with before the first frame
+    stdscr.refresh()
 
-    win.nodelay(True)
+    # In black and white mode every character uses the default attribute
+    attrs = {} if args.black_and_white else COLOR_PAIRS
+    board_view = WindowRenderer(win, attrs)
+    next_view = WindowRenderer(next_win, attrs) if next_win else None
+    score_view = WindowRenderer(score_win, {}) if score_win else None
+    opponent_view = WindowRenderer(opponent_win, attrs) if opponent_win else None
 
     did_something = True  # draw something at first iteration
     score = -1
     next_tile = None
-    level = tgame.level
+    level = -1
+    paused = False
+    was_paused = False
 
-    highscore = 0
-    player = ""
-    try:
-        highscore = _config["score"]["highscore"]
-        player = _config["score"]["player"]
-    except KeyError as _error:
-        _config["score"] = {"highscore": 0, "player": ""}
-        highscore = _config["score"]["highscore"]
-        player = _config["score"]["player"]
+    global _time_to_first_frame
+    highscore = None  # read after the first frame
 
-    while not tgame.game_over:
-        temp_level = level
-        key = "some key"
+    scheduler = FrameScheduler(tgame.frame_duration)
+    curve = tgame.speed_curve
+    autoshift = AutoShift(curve.das_delay, curve.das_repeat, curve.frame_duration)
 
-        try:
-            key = stdscr.getkey()
-            did_something = True
-        except Exception:  # No key has been pressed.
-            pass
-
-        if key in ACTIONS:
-            ACTIONS[key]()
-            did_something = True
-
-        now = time.time()
-        if now - running_time_inc > tgame.fall_duration:  # make the tetrominoe fall
-            logging.debug(f"now = {now}, inc_timeout = {tgame.fall_duration}")
-            tgame.increment()
-            running_time_inc += tgame.fall_duration
-            did_something = True
-
-        time.sleep(0.001)
+    key_time = None  # when the key that is being handled was read
+    saved_pieces = None  # number of pieces when the history was saved
 
+    while not tgame.game_over:
+        if history and tgame.pieces != saved_pieces:
+            history.save()  # a new tetrominoe appeared
+            saved_pieces = tgame.pieces
+
+        if profile:
+            render_start = time.perf_counter()
+        changed = False
+        if peer:
+            if did_something:
+                peer.send(tgame)
+            if peer.receive(tgame) and opponent_view:
+                changed |= opponent_view.draw(str(peer))
+            if peer.game_over:
+                break
         if did_something:  # only draw at change of state
-            win.clear()  ## clear screen
-            if not args.black_and_white:
-                _draw_in_color(win, tgame)
-            else:
-                win.addstr(str(tgame))
-            win.refresh()
+            changed |= board_view.draw_board(tgame.frame_buffer())
             did_something = False
 
-        if next_win and tgame.next != next_tile:
-            next_tile = copy.deepcopy(tgame.next)
-            next_win.clear()
-            if not args.black_and_white:
-                _draw_in_color(next_win, next_tile)
-            else:
-                next_win.addstr(str(next_tile))
-            next_win.refresh()
+        if next_view and tgame.next is not next_tile:
+            next_tile = tgame.next
+            changed |= next_view.draw_piece(next_tile.frame_buffer())
 
-        if score_win and tgame.score != score or temp_level != level:
+        if score_view and (
+            tgame.score != score or tgame.level != level or paused != was_paused
+        ):
             # update the score_win if we have one
-            score = tgame.score
-            level = temp_level
-            score_win.clear()
-            score_win.addstr(f"Score:\n  {score}\n")
-            score_win.addstr(f"Level:\n  {level}\n")
-            score_win.addstr(f"High score:\n  {highscore}")
-            score_win.refresh()
-
-        if level != tgame.level:
-            level = tgame.level
-
-
-def _curses_main(stdscr, args) -> int:
-    """Play tetris using curses. This function sets up the windows
-    and prepares the game to run."""
-
-    tgame = Tetris(style=args.style)
-
-    width, height = curses.COLS, curses.LINES
-
-    if height < Tetris.str_height() or width < Tetris.str_width():
-        raise RuntimeError(
-            "Terminal size is {} * {}, min = {}*{}".format(
-                width, height, Tetris.str_width(), Tetris.str_height()
+            score, level, was_paused = tgame.score, tgame.level, paused
+            shown_highscore = "" if highscore is None else highscore
+            changed |= score_view.draw(
+                f"Score:\n  {score}\nLevel:\n  {level}\n"
+                f"High score:\n  {shown_highscore}" + ("\n\nPaused" if paused else "")
             )
-        )
 
-    stdscr.nodelay(True)
+        if changed:  # push the changes of all windows at once
+            doupdate()
+            if profile:
+                now = time.perf_counter()
+                profile.add("render", now - render_start)
+                if key_time is not None:
+                    profile.add("latency", now - key_time)
+        key_time = None
+
+        if _time_to_first_frame is None:
+            _time_to_first_frame = time.perf_counter() - _START
+            if args.startup_benchmark:
+                break
+        if highscore is None:
+            # The first frame is on screen, so now read the leaderboard
+            best = _get_scores().best(_leaderboard_style(tgame))
+            highscore = best.score if best else 0
+            score = -1  # show it in the score window
+            scheduler.reset()
+            continue
+
+        # Sleep until a key is pressed or the tetrominoe has to fall
+        if paused:
+            stdscr.timeout(-1)
+        else:
+            # The bot takes an action every frame, the opponent's moves
+            # are shown within a frame and a held key may shift any frame
+            every_frame = bot or peer or autoshift.held is not None
+            wait = scheduler.time_until(1 if every_frame else tgame.frames_until_fall)
+            stdscr.timeout(math.ceil(wait * 1000))
+        keys = _read_keys(stdscr)
+        if profile and keys:
+            key_time = time.perf_counter()
+
+        actions = []
+        for key in keys:
+            if key == "p" and not peer:  # the opponent doesn't wait
+                paused = not paused
+                autoshift.release()
+                scheduler.reset()
+            elif paused and key != "q":
+                continue
+            elif key == "u" and history:
+                # drop the snapshot of the current tetrominoe and return
+                # to where the previous one appeared
+                if history.undo(2):
+                    actions.clear()
+                    did_something = True
+            elif key in ACTIONS:
+                actions.extend(autoshift.press(ACTIONS[key]))
+        if paused and not actions:
+            continue
+
+        frames = 0 if paused else scheduler.due()
+        if bot and frames and not actions:
+            actions.append(bot.policy(tgame))
+
+        for action in actions:
+            if tgame.game_over:
+                break
+            if recorder:
+                recorder.record(tgame.frames, action)
+            tgame.step(action)
+            did_something = True
+        if profile and actions and key_time is not None:
+            profile.add("input", time.perf_counter() - key_time)
+
+        if profile:
+            simulation_start = time.perf_counter()
+        for _ in range(frames):  # shift and make the tetrominoe fall
+            if tgame.game_over:
+                break
+            for action in autoshift.frame():
+                if recorder:
+                    recorder.record(tgame.frames, action)
+                tgame.step(action)
+                did_something = True
+            if tgame.frame():
+                did_something = True
+        if profile and frames:
+            profile.add("simulation", time.perf_counter() - simulation_start)
+
+    if peer:  # let the opponent know that this game is over
+        peer.send(tgame)
+    return scheduler
+
+
+def _read_keys(stdscr) -> List[str]:
+    """Wait for a key like getkey, then also read the keys that are
+    already pending, so keys repeated by the terminal don't queue up"""
+    keys = []
+    try:
+        key = stdscr.getkey()
+        stdscr.timeout(0)
+        while key is not None:  # the ANSI screen returns None on timeout
+            keys.append(key)
+            key = stdscr.getkey()
+    except curses.error:  # No (more) keys have been pressed.
+        pass
+    return keys
+
 
+def _curses_main(
+    stdscr, args
+) -> Tuple[Tetris, FrameScheduler, Optional["FrameProfile"], Optional["Peer"]]:
+    """Play tetris using curses"""
     if curses.has_colors():  # init global color pairs
         logging.info("Running with colors")
         curses.init_pair(1, curses.COLOR_CYAN, curses.COLOR_BLACK)
@@ -164,13 +307,129 @@ def _curses_main(stdscr, args) -> int:
         logging.info("Running without colors")
         args.black_and_white = True
 
-    board_win = curses.newwin(Tetris.str_height() + 1, Tetris.str_width() + 1)
-    next_win = curses.newwin(8, 8, 2, Tetris.str_width() + 4)
-    score_win = curses.newwin(10, 20, Tetris.str_height() // 2, Tetris.str_width() + 4)
+    return _play(stdscr, args, curses.newwin, curses.doupdate)
+
+
+def _ansi_main(
+    screen, args
+) -> Tuple[Tetris, FrameScheduler, Optional["FrameProfile"], Optional["Peer"]]:
+    """Play tetris writing ANSI escape sequences to the terminal"""
+    import ansi
+
+    COLOR_PAIRS.update(ansi.COLORS)
+    result = _play(screen, args, screen.newwin, screen.doupdate)
+    logging.info("ansi: %d bytes in %d writes", screen.bytes_written, screen.writes)
+    return result
+
+
+def _play(
+    stdscr, args, newwin, doupdate: Callable[[], None]
+) -> Tuple[Tetris, FrameScheduler, Optional["FrameProfile"], Optional["Peer"]]:
+    """Sets up the windows with newwin and prepares the game to run"""
+    seed = args.seed if args.seed is not None else random.randrange(1 << 63)
+    width, height = args.width, args.height
+    peer = None
+    if args.connect:
+        import versus
+
+        # The board of the opponent is used
+        peer, seed = versus.connect(args.connect)
+        width, height = peer.width, peer.height
+    tgame = Tetris(
+        width, height, style=args.curve or args.style, seed=seed, ghost=args.ghost
+    )
+    recorder = bot = profile = history = None
+    if args.record:
+        from replay import Recorder
+
+        recorder = Recorder(tgame)
+    if args.bot:
+        from bot import Bot
+
+        bot = Bot()
+    if args.profile:
+        from profiling import FrameProfile
+
+        profile = FrameProfile()
+    if args.undo:
+        from undo import UndoHistory
+
+        history = UndoHistory(tgame, args.undo + 1)
+
+    str_width, str_height = tgame.str_width(), tgame.str_height()
+    min_width, min_height = str_width, str_height
+    if args.listen or args.connect:
+        # room for the opponent's board and score right of the score window
+        min_width = 2 * str_width + 25
+        min_height += 3
+
+    lines, cols = stdscr.getmaxyx()
+    if lines < min_height or cols < min_width:
+        raise RuntimeError(
+            "Terminal size is {} * {}, min = {}*{}".format(
+                cols, lines, min_width, min_height
+            )
+        )
+
+    if args.listen:
+        import versus
 
-    _game_loop(args, tgame, stdscr, board_win, next_win, score_win)
+        stdscr.addstr(0, 0, f"Waiting for an opponent on {args.listen}")
+        stdscr.refresh()
+        peer = versus.listen(args.listen, tgame)
+        stdscr.erase()
 
-    return tgame.score
+    board_win = newwin(str_height + 1, str_width + 1)
+    next_win = newwin(8, 8, 2, str_width + 4)
+    score_win = newwin(10, 20, min(str_height // 2, 12), str_width + 4)
+    opponent_win = None
+    if peer:
+        opponent_win = newwin(str_height + 3, str_width + 1, 0, str_width + 24)
+
+    with gc_mode(args.gc):
+        try:
+            scheduler = _game_loop(
+                args,
+                tgame,
+                stdscr,
+                board_win,
+                next_win,
+                score_win,
+                recorder,
+                bot,
+                profile,
+                peer,
+                opponent_win,
+                history,
+                doupdate,
+            )
+        finally:
+            if peer:
+                peer.close()
+    logging.info(scheduler.report())
+    if profile:
+        logging.info("profile:\n%s", profile.report())
+    if recorder:
+        recorder.save(args.record, tgame)
+
+    return tgame, scheduler, profile, peer
+
+
+def _leaderboard_style(tgame: Tetris) -> str:
+    """Games on a board of another size get a leaderboard of their own"""
+    if (tgame.width, tgame.height) == (DEFAULT_WIDTH, DEFAULT_HEIGHT):
+        return tgame.style
+    return f"{tgame.style} {tgame.width}x{tgame.height}"
+
+
+def _print_leaderboard(style: str) -> None:
+    """Print the best scores of a style"""
+    print(f"Top {_TOP_N} {style}:")
+    for rank, entry in enumerate(_get_scores().top(style, _TOP_N), 1):
+        print(
+            f"{rank:3}. {entry.player:20} {entry.score:8} "
+            f"lines {entry.lines:4} level {entry.level:3} {entry.date}"
+        )
 
 
 def main():
@@ -206,8 +465,126 @@ def main():
             "speed that the tetrominoes are falling"
         ),
     )
+    cmdparser.add_argument(
+        "--width",
+        type=int,
+        default=DEFAULT_WIDTH,
+        help="number of columns of the board, default %(default)s",
+    )
+    cmdparser.add_argument(
+        "--height",
+        type=int,
+        default=DEFAULT_HEIGHT,
+        help="number of rows of the board, default %(default)s",
+    )
+    cmdparser.add_argument(
+        "--speed-curve",
+        metavar="FILE",
+        help=(
+            "play with the speed curve of a JSON file instead of the style, "
+            'like {"name": "Fast", "fps": 60, "fall_frames": [30, 20, 10, 5]}'
+        ),
+    )
+    cmdparser.add_argument(
+        "--ansi",
+        action="store_true",
+        help=(
+            "draw with ANSI escape sequences instead of curses, this sends "
+            "fewer bytes per frame"
+        ),
+    )
+    cmdparser.add_argument(
+        "--gc",
+        choices=GC_MODES,
+        default="on",
+        help="run the garbage collector normally, frozen or off during play",
+    )
+    cmdparser.add_argument(
+        "--seed", type=int, help="seed that determines the order of the tetrominoes"
+    )
+    cmdparser.add_argument(
+        "-r",
+        "--record",
+        type=str,
+        help="record the game to this file, it can be verified with replay.py",
+    )
+    cmdparser.add_argument(
+        "-g", "--ghost", action="store_true", help="show where the tetrominoe lands"
+    )
+    cmdparser.add_argument(
+        "--bot", action="store_true", help="let the bot play, press q to stop it"
+    )
+    versus_group = cmdparser.add_mutually_exclusive_group()
+    versus_group.add_argument(
+        "--listen",
+        nargs="?",
+        const=_VERSUS_ADDRESS,
+        metavar="ADDRESS",
+        help=(
+            "play versus mode, wait for an opponent on HOST:PORT or on a unix "
+            "socket when the address contains a /, defaults to %(const)s"
+        ),
+    )
+    versus_group.add_argument(
+        "--connect",
+        metavar="ADDRESS",
+        help="play versus mode against the opponent listening on ADDRESS",
+    )
+    cmdparser.add_argument(
+        "--undo",
+        type=int,
+        nargs="?",
+        const=100,
+        default=0,
+        metavar="N",
+        help=(
+            "press u to take back a tetrominoe, up to N (default %(const)s) "
+            "times in a row, these games don't enter the leaderboard"
+        ),
+    )
+    cmdparser.add_argument(
+        "--profile",
+        action="store_true",
+        help=(
+            "time input handling, simulation, rendering and key to screen "
+            "latency of every frame, the percentiles are printed after the "
+            "game and written to the log file"
+        ),
+    )
+    cmdparser.add_argument(
+        "--leaderboard",
+        action="store_true",
+        help="print the best scores of the selected style and exit",
+    )
+    cmdparser.add_argument(
+        "--startup-benchmark",
+        action="store_true",
+        help="quit after the first frame and print how long it took to show it",
+    )
+    cmdparser.add_argument(
+        "--frame-stats",
+        action="store_true",
+        help="print how late the frames were handled after the game",
+    )
 
     args = cmdparser.parse_intermixed_args()
+    if args.width < 4 or args.height < 4:
+        cmdparser.error("the board should be at least 4 * 4")
+    if args.seed is not None and not 0 <= args.seed < 2**64:
+        # Recordings and versus mode store the seed in 64 bits
+        cmdparser.error("the seed should be between 0 and 2**64 - 1")
+    if args.undo and (args.record or args.listen or args.connect):
+        cmdparser.error("--undo can't be combined with --record or versus mode")
+    if args.record and (args.listen or args.connect):
+        cmdparser.error("versus games can't be recorded, garbage isn't replayed")
+    args.curve = None
+    if args.speed_curve:
+        if args.record:
+            cmdparser.error("games with a custom speed curve can't be recorded")
+        try:
+            args.curve = load_curve(args.speed_curve)
+        except (OSError, ValueError) as error:
+            cmdparser.error(str(error))
 
     if args.log_file:
         level = loglevelmap[args.log_level]
@@ -215,16 +592,52 @@ def main():
         logging.info("logging with loglevel: {}".format(args.log_level.upper()))
 
     try:
-        global _config
-        _config = ConfigFile().read()
-
-        score = curses.wrapper(_curses_main, args)
-
-        if score > _config["score"]["highscore"]:
-            player = input("New highscore enter player name:")
-            _config["score"] = {"highscore": score, "player": player}
-            ConfigFile().write(_config)
-        print(f"Score = {score}\nGame Over...")
+        if args.leaderboard:
+            tgame = Tetris(args.width, args.height, style=args.curve or args.style)
+            _print_leaderboard(_leaderboard_style(tgame))
+            return
+
+        if args.ansi:
+            import ansi
+
+            result = ansi.wrapper(_ansi_main, args)
+        else:
+            result = curses.wrapper(_curses_main, args)
+        tgame, scheduler, profile, peer = result
+        if args.startup_benchmark:
+            print(f"time to first frame = {_time_to_first_frame * 1000:.1f}ms")
+            return
+        if args.frame_stats:
+            print(scheduler.report())
+        if profile:
+            print(profile.report())
+        if peer:
+            # Versus scores depend on the opponent, they are kept off the
+            # leaderboard
+            won = peer.game_over and not tgame.game_over
+            print(f"Score = {tgame.score}, opponent = {peer.score}")
+            print("You win!" if won else "You lose...")
+            return
+        if args.undo or args.bot:
+            # Games with undo or played by the bot aren't the player's
+            print(f"Score = {tgame.score}\nGame Over...")
+            return
+
+        config = _get_config()
+        scores = _get_scores()
+        # Older versions stored the player with the single high score
+        player = config.get("player", config.get("score", {}).get("player", ""))
+        style = _leaderboard_style(tgame)
+        if tgame.score > 0 and scores.rank(tgame.score, style) <= _TOP_N:
+            name = input(f"New top {_TOP_N} score, enter player name [{player}]:")
+            if name and name != player:
+                from config import ConfigFile
+
+                player = name
+                config["player"] = player
+                ConfigFile().write(config)
+        scores.add(player, tgame.score, tgame.lines, tgame.level, style)
+        print(f"Score = {tgame.score}\nGame Over...")
     except RuntimeError as error:
         sys.exit(str(error))
 
@@ -0,0 +1,106 @@
+"""Delayed auto shift (DAS) of the NES for keys read from a terminal.
+
+A terminal sends no key releases, a held key shows up as a stream of
+repeated presses after the repeat delay of the terminal. The first
+repeat can't be told from a second tap, so it shifts once like a tap.
+Only when the next press follows it within the short repeat interval is
+the key held, since its first press. Once the repeats stop for twice
+their interval the key is released.
+
+A press shifts the tetrominoe at once. While left or right is held it
+shifts again das_delay frames after the first press and then every
+das_repeat frames, whatever the repeat rate of the terminal is. Repeats
+of the other keys within one frame are dropped.
+"""
+
+import math
+from typing import List, Optional, Set
+
+from tetris import Action
+
+# Terminals start repeating a held key after 250 to 660 ms
+FIRST_REPEAT_TIMEOUT = 0.7
+# And then repeat it at least every 50 ms or so
+RELEASE_TIMEOUT = 0.1
+
+_SHIFTS = (Action.LEFT, Action.RIGHT)
+
+
+class AutoShift:
+    """Turns the pressed keys into actions, frame by frame"""
+
+    def __init__(
+        self,
+        das_delay: int,
+        das_repeat: int,
+        frame_duration: float,
+        release_timeout: float = RELEASE_TIMEOUT,
+        first_repeat_timeout: float = FIRST_REPEAT_TIMEOUT,
+    ):
+        self.das_delay = das_delay
+        self.das_repeat = das_repeat
+        self._release_frames = max(1, math.ceil(release_timeout / frame_duration))
+        self._first_repeat_frames = max(
+            self._release_frames, math.ceil(first_repeat_timeout / frame_duration)
+        )
+        self.held: Optional[Action] = None  # LEFT or RIGHT while it is down
+        self._repeated = False  # whether the terminal repeats the held key
+        self._tapped = False  # whether the held key was pressed again
+        self._charge = 0  # frames since the held key was first pressed
+        self._next_shift = 0  # value of _charge at the next shift
+        self._quiet = 0  # frames since the held key was last seen
+        self._timeout = self._release_frames  # quiet frames until released
+        self._pressed: Set[Action] = set()  # actions pressed in this frame
+
+    def press(self, action: Action) -> List[Action]:
+        """A key was read, returns the actions to take now"""
+        if action in self._pressed:
+            return []
+        self._pressed.add(action)
+        if action not in _SHIFTS:
+            return [action]
+        if action is self.held:
+            if self._repeated:
+                # Twice the interval of the repeats allows for some jitter
+                self._timeout = min(self._release_frames, max(2, 2 * self._quiet))
+                self._quiet = 0
+                return []
+            if self._tapped and self._quiet <= self._release_frames:
+                # A repeat right after the first one, the key is held and
+                # the charge keeps counting from its first press
+                self._repeated = True
+                self._timeout = self._release_frames
+                self._quiet = 0
+                return []
+            # A tap, or the first repeat of the terminal
+            self._tapped = True
+            self._quiet = 0
+            self._next_shift = max(self.das_delay, self._charge + self.das_repeat)
+            return [action]
+        self.held = action
+        self._repeated = self._tapped = False
+        self._charge = self._quiet = 0
+        self._timeout = self._first_repeat_frames
+        self._next_shift = self.das_delay
+        return [action]
+
+    def frame(self) -> List[Action]:
+        """Advance one frame, returns the shifts of the held key"""
+        self._pressed.clear()
+        if self.held is None:
+            return []
+        self._quiet += 1
+        if self._quiet > self._timeout:
+            self.held = None
+            return []
+        shifts = []
+        if self._repeated and self._charge >= self._next_shift:
+            self._next_shift = self._charge + self.das_repeat
+            shifts.append(self.held)
+        self._charge += 1
+        return shifts
+
+    def release(self) -> None:
+        """Forget the held key, like after a pause"""
+        self.held = None
+        self._pressed.clear()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""Simulate many games of Tetᴙis at once using NumPy.
+
+Every board is stored as a row of integer bitmasks, just like the
+occupation layer of tetris.Tetris, so all games are updated with a
+handful of vectorized operations instead of a Python loop per game.
+"""
+
+import argparse as ap
+import time
+from typing import Optional
+
+import numpy as np
+
+from speed import CURVES
+from tetris import TETROMINOES, LINE_SCORES, Action
+
+_MAX_ROTATIONS = 4
+_MAX_TILE_ROWS = 4
+
+
+def _piece_tables():
+    """Convert the tetrominoes from the tetris module to lookup tables
+    indexed by [piece, rotation]."""
+    shape = (len(TETROMINOES), _MAX_ROTATIONS)
+    masks = np.zeros(shape + (_MAX_TILE_ROWS,), dtype=np.int64)
+    widths = np.zeros(shape, dtype=np.int64)
+    num_rotations = np.zeros(len(TETROMINOES), dtype=np.int64)
+    for piece, tetrominoe in enumerate(TETROMINOES):
+        num_rotations[piece] = len(tetrominoe.tiles)
+        for rotation, tile in enumerate(tetrominoe.tiles):
+            masks[piece, rotation, : tile.height] = tile.rowmasks
+            widths[piece, rotation] = tile.width
+    return masks, widths, num_rotations
+
+
+_MASKS, _WIDTHS, _NUM_ROTATIONS = _piece_tables()
+
+# Index 0 is for locks that don't clear a line
+_SCORES = np.array((0,) + LINE_SCORES, dtype=np.int64)
+
+# Levels past the end of a table use its last entry
+_DESCENT = {name: np.array(curve.fall_frames) for name, curve in CURVES.items()}
+
+
+class BatchTetris:
+    """N independent games of tetris, advanced in lock step"""
+
+    def __init__(
+        self,
+        num_games: int,
+        width: int = 10,
+        height: int = 20,
+        style: str = "NTSC",
+        seed: Optional[int] = None,
+    ):
+        if style not in _DESCENT:
+            raise ValueError(f"style should be one of {list(_DESCENT)}")
+        if not 4 <= width < 63:
+            raise ValueError("The width of the board should be in the range [4, 62]")
+        self.num_games = num_games
+        self.width, self.height = width, height
+        self._descent = _DESCENT[style]
+        self._rng = np.random.default_rng(seed)
+        self._full_row = (1 << width) - 1
+        self._row_offsets = np.arange(_MAX_TILE_ROWS)
+
+        # The rows below the board are full, so tiles can't fall through
+        self.boards = np.zeros((num_games, height + _MAX_TILE_ROWS), dtype=np.int64)
+        self.boards[:, height:] = self._full_row
+
+        self.piece = self._random_pieces(num_games)
+        self.next = self._random_pieces(num_games)
+        self.rotation = np.zeros(num_games, dtype=np.int64)
+        self.x = width // 2 - _WIDTHS[self.piece, 0] // 2
+        self.y = np.zeros(num_games, dtype=np.int64)
+
+        self.score = np.zeros(num_games, dtype=np.int64)
+        self.lines = np.zeros(num_games, dtype=np.int64)
+        self.pieces = np.zeros(num_games, dtype=np.int64)
+        self.frames = np.zeros(num_games, dtype=np.int64)
+        self.game_over = np.zeros(num_games, dtype=bool)
+
+    def _random_pieces(self, num: int) -> np.ndarray:
+        return self._rng.integers(0, len(TETROMINOES), num)
+
+    @property
+    def level(self) -> np.ndarray:
+        """Get the current level of every game"""
+        return self.lines // 10
+
+    def _collides(self, games, piece, rotation, x, y) -> np.ndarray:
+        """Computes for the selected games whether the piece at the given
+        position would collide with the walls or the board"""
+        rows = np.take_along_axis(
+            self.boards[games], y[:, None] + self._row_offsets, axis=1
+        )
+        masks = _MASKS[piece, rotation] << np.maximum(x, 0)[:, None]
+        return (
+            (rows & masks).any(axis=1)
+            | (x < 0)
+            | (x + _WIDTHS[piece, rotation] > self.width)
+        )
+
+    def _try_move(self, games, dx, rotate) -> None:
+        """Shift and/or rotate the selected games when that doesn't collide"""
+        if not games.size:
+            return
+        piece = self.piece[games]
+        rotation = self.rotation[games]
+        if rotate:
+            rotation = (rotation + 1) % _NUM_ROTATIONS[piece]
+        x = self.x[games] + dx
+        free = ~self._collides(games, piece, rotation, x, self.y[games])
+        games = games[free]
+        self.x[games] = x[free]
+        self.rotation[games] = rotation[free]
+
+    def _fall(self, games) -> None:
+        """Move the selected games one row down, games that can't
+        move lock their piece"""
+        if not games.size:
+            return
+        hit = self._collides(
+            games,
+            self.piece[games],
+            self.rotation[games],
+            self.x[games],
+            self.y[games] + 1,
+        )
+        self.y[games[~hit]] += 1
+        self._lock(games[hit])
+
+    def _drop(self, games) -> None:
+        """Drop the pieces of the selected games as far as possible"""
+        falling = games
+        while falling.size:
+            hit = self._collides(
+                falling,
+                self.piece[falling],
+                self.rotation[falling],
+                self.x[falling],
+                self.y[falling] + 1,
+            )
+            falling = falling[~hit]
+            self.y[falling] += 1
+        self._lock(games)
+
+    def _lock(self, games) -> None:
+        """Store the pieces in the boards, clear full lines, update the
+        scores and spawn the next pieces"""
+        if not games.size:
+            return
+        piece, rotation = self.piece[games], self.rotation[games]
+        boards = self.boards[games]
+        rows = self.y[games][:, None] + self._row_offsets
+        painted = np.take_along_axis(boards, rows, axis=1) | (
+            _MASKS[piece, rotation] << self.x[games][:, None]
+        )
+        np.put_along_axis(boards, rows, painted, axis=1)
+
+        # Move full rows to the top, keeping the order of the others
+        visible = boards[:, : self.height]
+        full = visible == self._full_row
+        num_full = full.sum(axis=1)
+        order = np.argsort(~full, axis=1, kind="stable")
+        visible = np.take_along_axis(visible, order, axis=1)
+        visible[np.arange(self.height) < num_full[:, None]] = 0
+        boards[:, : self.height] = visible
+        self.boards[games] = boards
+
+        self.lines[games] += num_full
+        self.score[games] += _SCORES[num_full] * (self.lines[games] // 10 + 1)
+        self.pieces[games] += 1
+        self._spawn(games)
+
+    def _spawn(self, games) -> None:
+        """Use the next pieces and compute new next pieces"""
+        piece = self.next[games]
+        self.piece[games] = piece
+        self.next[games] = self._random_pieces(games.size)
+        self.rotation[games] = 0
+        self.x[games] = self.width // 2 - _WIDTHS[piece, 0] // 2
+        self.y[games] = 0
+        self.frames[games] = 0
+        self.game_over[games] = self._collides(
+            games, piece, self.rotation[games], self.x[games], self.y[games]
+        )
+
+    def step(self, actions: np.ndarray) -> None:
+        """Apply one tetris.Action per game, finished games are left alone"""
+        active = ~self.game_over
+        for action, dx, rotate in (
+            (Action.LEFT, -1, False),
+            (Action.RIGHT, 1, False),
+            (Action.ROTATE, 0, True),
+        ):
+            self._try_move(np.flatnonzero(active & (actions == action)), dx, rotate)
+        self._fall(np.flatnonzero(active & (actions == Action.DOWN)))
+        self._drop(np.flatnonzero(active & (actions == Action.DROP)))
+        self.game_over |= active & (actions == Action.QUIT)
+
+    def frame(self) -> None:
+        """Advance all running games one NES frame, the pieces fall
+        at the speed of the level of each game"""
+        active = np.flatnonzero(~self.game_over)
+        self.frames[active] += 1
+        level = np.minimum(self.lines[active] // 10, len(self._descent) - 1)
+        due = active[self.frames[active] >= self._descent[level]]
+        self.frames[due] = 0
+        self._fall(due)
+
+    def place(self, rotation: np.ndarray, column: np.ndarray) -> None:
+        """Put the current piece of every running game in the given
+        rotation and column and drop it there. Placements that collide at
+        the spawn position keep the piece where it is."""
+        games = np.flatnonzero(~self.game_over)
+        piece = self.piece[games]
+        rotation = rotation[games] % _NUM_ROTATIONS[piece]
+        x = column[games]
+        free = ~self._collides(games, piece, rotation, x, self.y[games])
+        moved = games[free]
+        self.rotation[moved] = rotation[free]
+        self.x[moved] = x[free]
+        self._drop(games)
+
+    def random_placements(self):
+        """Returns a random rotation and column for every game"""
+        rotation = self._rng.integers(0, _MAX_ROTATIONS, self.num_games)
+        column = self._rng.integers(0, self.width, self.num_games)
+        return rotation, column
+
+
+def main():
+    """Play random placements in many games and report the throughput"""
+    cmdparser = ap.ArgumentParser(
+        "batch", "Simulate many games of Tetᴙis at once with NumPy"
+    )
+    cmdparser.add_argument(
+        "-n", "--num-games", type=int, default=10000, help="number of games"
+    )
+    cmdparser.add_argument(
+        "-p",
+        "--placements",
+        type=int,
+        default=100,
+        help="number of placements to try per game",
+    )
+    cmdparser.add_argument("--seed", type=int, default=0, help="seed of the batch")
+    args = cmdparser.parse_args()
+
+    batch = BatchTetris(args.num_games, seed=args.seed)
+    start = time.perf_counter()
+    for _ in range(args.placements):
+        if batch.game_over.all():
+            break
+        batch.place(*batch.random_placements())
+    duration = time.perf_counter() - start
+
+    pieces = int(batch.pieces.sum())
+    print(f"games = {args.num_games}, placements = {pieces}")
+    print(f"lines = {int(batch.lines.sum())}, max score = {int(batch.score.max())}")
+    print(f"duration = {duration:.3f}s")
+    print(f"placements/min = {pieces / duration * 60:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""Benchmarks of the Tetᴙis engine and renderer.
+
+The results are written as JSON, so the results of two branches can be
+compared with --compare.
+"""
+
+import argparse as ap
+import json
+import platform
+import random as r
+import sys
+import time
+from typing import Callable, Dict, Optional
+
+import headless
+import replay
+from render import WindowRenderer
+from tetris import Action, CODES, Tetris, LINE
+
+
+class FakeWindow:
+    """Stands in for a curses window, it only counts the calls"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def addstr(self, *_args):
+        self.calls += 1
+
+    def move(self, *_args):
+        self.calls += 1
+
+    def clrtoeol(self):
+        self.calls += 1
+
+    def noutrefresh(self):
+        self.calls += 1
+
+    def erase(self):
+        self.calls += 1
+
+
+def _time(func: Callable[[], object], min_time: float) -> float:
+    """Returns the mean duration of func in seconds, it is called until
+    at least min_time seconds have passed"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        duration = time.perf_counter() - start
+        if duration >= min_time:
+            return duration / number
+        number *= 2
+
+
+def _time_with_setup(
+    func: Callable[[], object], setup: Callable[[], object], min_time: float
+) -> float:
+    """Like _time, but setup runs untimed before every call of func"""
+    total = 0.0
+    calls = 0
+    while total < min_time:
+        setup()
+        start = time.perf_counter()
+        func()
+        total += time.perf_counter() - start
+        calls += 1
+    return total / calls
+
+
+def _midgame(seed: int = 1, width: int = 10, height: int = 20) -> Tetris:
+    """A game with some tetrominoes on the board"""
+    tgame = Tetris(width, height, seed=seed)
+    rng = r.Random(seed)
+    while tgame.pieces < 12:
+        tgame.step(rng.choice((Action.LEFT, Action.RIGHT, Action.ROTATE)))
+        tgame.step(Action.DROP)
+    return tgame
+
+
+def _fill_rows(tgame: Tetris, num_full: int) -> None:
+    """Make the bottom num_full rows full and the rows above empty"""
+    tgame._rows = [0] * tgame.height
+    tgame._board = [bytes(tgame.width)] * tgame.height
+    for row in range(tgame.height - num_full, tgame.height):
+        tgame._rows[row] = tgame._full_row
+        tgame._board[row] = bytes([CODES["C"]] * tgame.width)
+    tgame._recount()
+
+
+def _time_moves(tgame: Tetris, min_time: float) -> float:
+    """Move the tetrominoe back and forth and draw the frame buffer of the
+    board after every move"""
+    renderer = WindowRenderer(FakeWindow(), {"!": 1, "C": 2, "Y": 3})
+    moves = iter(range(sys.maxsize))
+
+    def move_and_draw():
+        tgame.step(Action.LEFT if next(moves) % 4 < 2 else Action.RIGHT)
+        renderer.draw_board(tgame.frame_buffer())
+
+    return _time(move_and_draw, min_time)
+
+
+def micro_benchmarks(min_time: float) -> Dict[str, float]:
+    """Time the individual operations of the engine and the renderer"""
+    results = {}
+
+    tgame = _midgame()
+    results["collision"] = _time(tgame._collision, min_time)
+    results["tetris_str"] = _time(tgame.__str__, min_time)
+    results["tetrominoe_str"] = _time(LINE.__str__, min_time)
+    results["new_piece"] = _time(Tetris(seed=1)._setup_new, min_time)
+
+    results["snapshot"] = _time(tgame.snapshot, min_time)
+    snapshot = tgame.snapshot()
+    results["restore"] = _time(lambda: tgame.restore(snapshot), min_time)
+    results["clone"] = _time(tgame.clone, min_time)
+
+    # Increment and drop change the game, so every call gets a fresh clone
+    def fresh():
+        fresh.game = tgame.clone()
+
+    results["increment"] = _time_with_setup(
+        lambda: fresh.game.increment(), fresh, min_time
+    )
+    results["drop"] = _time_with_setup(lambda: fresh.game.drop(), fresh, min_time)
+
+    for num_full in range(1, 5):
+        game = Tetris(seed=1)
+        results[f"check_score_{num_full}"] = _time_with_setup(
+            game._check_score, lambda: _fill_rows(game, num_full), min_time
+        )
+
+    # Stress test boards, the costs should hardly grow with the area
+    large = _midgame(width=300, height=300)
+    results["tetris_str_large"] = _time(large.__str__, min_time)
+    results["collision_large"] = _time(large._collision, min_time)
+    rows = range(large.height - 4, large.height)
+    results["check_score_4_large"] = _time_with_setup(
+        lambda: large._check_score(rows), lambda: _fill_rows(large, 4), min_time
+    )
+
+    frames = [str(_midgame(seed)) for seed in range(8)]
+    window = FakeWindow()
+    renderer = WindowRenderer(window, {"!": 1, "C": 2, "Y": 3})
+
+    def full_redraw():
+        renderer.invalidate()
+        renderer.draw(frames[0])
+
+    results["render_full"] = _time(full_redraw, min_time)
+    frame_index = iter(range(sys.maxsize))
+    results["render_diff"] = _time(
+        lambda: renderer.draw(frames[next(frame_index) % len(frames)]), min_time
+    )
+
+    results["render_move"] = _time_moves(_midgame(), min_time)
+    results["render_move_large"] = _time_moves(
+        _midgame(width=300, height=300), min_time
+    )
+    return results
+
+
+def macro_benchmarks(num_games: int) -> Dict[str, float]:
+    """End to end throughput of whole games"""
+    results = {}
+    start = time.perf_counter()
+    headless.run(num_games)
+    results["games_per_second"] = num_games / (time.perf_counter() - start)
+
+    recordings = [replay.random_recording(seed) for seed in range(num_games)]
+
+    start = time.perf_counter()
+    frames = 0
+    for recording in recordings:
+        replay.replay(recording)
+        frames += recording.frames
+    results["frames_per_second"] = frames / (time.perf_counter() - start)
+    return results
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> bool:
+    """Print how the results differ from the baseline, returns False
+    when something got slower than the threshold allows"""
+    ok = True
+    for name, value in results["micro"].items():
+        base = baseline["micro"].get(name)
+        if base:
+            change = value / base - 1
+            slower = change > threshold
+            ok &= not slower
+            print(f"{name:20} {change:+7.1%}{'  SLOWER' if slower else ''}")
+    for name, value in results["macro"].items():
+        base = baseline["macro"].get(name)
+        if base:
+            change = value / base - 1  # higher is better
+            slower = change < -threshold
+            ok &= not slower
+            print(f"{name:20} {change:+7.1%}{'  SLOWER' if slower else ''}")
+    return ok
+
+
+def main():
+    """Run the benchmarks and write the results to a JSON file"""
+    cmdparser = ap.ArgumentParser("bench", "Benchmark the Tetᴙis engine and renderer")
+    cmdparser.add_argument(
+        "-o", "--output", type=str, default="bench.json", help="file for the results"
+    )
+    cmdparser.add_argument(
+        "-c", "--compare", type=str, help="results of an earlier run to compare with"
+    )
+    cmdparser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="fraction that a benchmark may get slower when comparing",
+    )
+    cmdparser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.2,
+        help="seconds to spend on every micro benchmark",
+    )
+    cmdparser.add_argument(
+        "--games", type=int, default=200, help="games to play for the macro benchmarks"
+    )
+    args = cmdparser.parse_args()
+
+    results = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "micro": micro_benchmarks(args.min_time),  # seconds per call
+        "macro": macro_benchmarks(args.games),  # per second
+    }
+    with open(args.output, "w") as outfile:
+        json.dump(results, outfile, indent=4)
+
+    for name, value in results["micro"].items():
+        print(f"{name:20} {value * 1e6:10.2f}us")
+    for name, value in results["macro"].items():
+        print(f"{name:20} {value:10.1f}/s")
+
+    if args.compare:
+        with open(args.compare) as infile:
+            baseline: Optional[Dict] = json.load(infile)
+        if not compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""A bot that plays Tetᴙis by searching for the best placement"""
+
+from collections import deque
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from tetris import Action, Events, Tetrominoe, Tetris, Tile
+
+
+class Weights(NamedTuple):
+    """Weights of the features of a board, a higher score is better"""
+
+    height: float = -0.510066
+    lines: float = 0.760666
+    holes: float = -0.35663
+    bumpiness: float = -0.184483
+
+
+class Placement(NamedTuple):
+    """A position where the current tetrominoe can come to rest and the
+    actions that bring it there"""
+
+    rotation: int
+    x: int
+    y: int
+    actions: Tuple[Action, ...]
+
+
+def _fits(rows: Sequence[int], tile: Tile, x: int, y: int, width: int) -> bool:
+    """Checks whether tile fits on the board at column x and row y"""
+    if x < 0 or x + tile.width > width or y + tile.height > len(rows):
+        return False
+    for mask in tile.rowmasks:
+        if rows[y] & (mask << x):
+            return False
+        y += 1
+    return True
+
+
+def _lock(
+    rows: Sequence[int], tile: Tile, x: int, y: int, full_row: int
+) -> Tuple[List[int], int]:
+    """Returns the rows with tile stored at x, y and full rows cleared
+    and the number of lines cleared"""
+    rows = list(rows)
+    for mask in tile.rowmasks:
+        rows[y] |= mask << x
+        y += 1
+    kept = [row for row in rows if row != full_row]
+    lines = len(rows) - len(kept)
+    if lines:
+        kept[:0] = [0] * lines
+    return kept, lines
+
+
+def features(rows: Sequence[int], width: int) -> Tuple[int, int, int]:
+    """Computes the aggregate height, the number of holes and the
+    bumpiness of a board"""
+    height = len(rows)
+    heights = [0] * width
+    seen = holes = 0
+    for index, row in enumerate(rows):
+        new = row & ~seen
+        while new:
+            low = new & -new
+            heights[low.bit_length() - 1] = height - index
+            new ^= low
+        seen |= row
+        holes += (seen & ~row).bit_count()
+    bumpiness = sum(abs(left - right) for left, right in zip(heights, heights[1:]))
+    return sum(heights), holes, bumpiness
+
+
+def _tops(rows: Sequence[int], width: int) -> List[int]:
+    """Index of the highest occupied row of every column, or the number of
+    rows for an empty column"""
+    tops = [len(rows)] * width
+    seen = 0
+    for index, row in enumerate(rows):
+        new = row & ~seen
+        while new:
+            low = new & -new
+            tops[low.bit_length() - 1] = index
+            new ^= low
+        seen |= row
+    return tops
+
+
+def placements(tgame: Tetris) -> List[Placement]:
+    """Every position where the current tetrominoe can come to rest,
+    including the ones that can only be reached by sliding or rotating
+    underneath an overhang."""
+    rows = tgame.rows
+    width = tgame.width
+    tiles = tgame.current.tiles
+    start = (tgame.current.rotation, tgame.tet_width, tgame.tet_height)
+    if not _fits(rows, tiles[start[0]], start[1], start[2], width):
+        return []
+
+    # Search one row at a time, so the tetrominoe is moved and rotated
+    # as high as possible and only descends when it has to.
+    parents = {start: None}
+    row = [start]
+    found = []
+    while row:
+        todo = deque(row)
+        while todo:
+            state = todo.popleft()
+            rotation, x, y = state
+            for action, next_state in (
+                (Action.LEFT, (rotation, x - 1, y)),
+                (Action.RIGHT, (rotation, x + 1, y)),
+                (Action.ROTATE, ((rotation + 1) % len(tiles), x, y)),
+            ):
+                if next_state not in parents and _fits(
+                    rows, tiles[next_state[0]], next_state[1], y, width
+                ):
+                    parents[next_state] = (state, action)
+                    row.append(next_state)
+                    todo.append(next_state)
+
+        below = []
+        for state in row:
+            rotation, x, y = state
+            next_state = (rotation, x, y + 1)
+            if _fits(rows, tiles[rotation], x, y + 1, width):
+                parents[next_state] = (state, Action.DOWN)
+                below.append(next_state)
+            else:
+                found.append(state)
+        row = below
+    return [Placement(*state, _actions(parents, state)) for state in found]
+
+
+def _actions(parents, state) -> Tuple[Action, ...]:
+    """The actions that lead from the start to state, the downward moves
+    at the end are replaced by a drop"""
+    actions = []
+    while parents[state] is not None:
+        state, action = parents[state]
+        actions.append(action)
+    actions.reverse()
+    while actions and actions[-1] == Action.DOWN:
+        actions.pop()
+    actions.append(Action.DROP)
+    return tuple(actions)
+
+
+class Bot:
+    """Picks the placement that leads to the best board, optionally
+    looking at the next tetrominoe as well"""
+
+    def __init__(
+        self, weights: Weights = Weights(), lookahead: bool = True, beam: int = 6
+    ):
+        self.weights = weights
+        self.lookahead = lookahead
+        self.beam = beam
+        self._plan: List[Action] = []
+        self._planned_piece = -1
+
+    def _evaluate(self, rows: Sequence[int], width: int, lines: int) -> float:
+        height, holes, bumpiness = features(rows, width)
+        weights = self.weights
+        return (
+            weights.height * height
+            + weights.lines * lines
+            + weights.holes * holes
+            + weights.bumpiness * bumpiness
+        )
+
+    def _best_drop(
+        self, rows: Sequence[int], width: int, full_row: int, piece: Tetrominoe
+    ) -> float:
+        """The best score of dropping piece straight down from the top in
+        any rotation and column"""
+        tops = _tops(rows, width)
+        best = None
+        for tile in piece.tiles:
+            bottom = tile.bottoms
+            for x in range(width - tile.width + 1):
+                y = min(tops[x + col] - bottom[col] for col in range(tile.width)) - 1
+                if y < 0:
+                    continue
+                after, lines = _lock(rows, tile, x, y, full_row)
+                score = self._evaluate(after, width, lines)
+                if best is None or score > best:
+                    best = score
+        return best
+
+    def choose(self, tgame: Tetris) -> Optional[Placement]:
+        """Returns the best placement of the current tetrominoe. With
+        lookahead the best beam placements are scored again by the best
+        drop of the next tetrominoe that follows them."""
+        rows = tgame.rows
+        width = tgame.width
+        full_row = (1 << width) - 1
+        tiles = tgame.current.tiles
+        scored = []
+        for placement in placements(tgame):
+            after, lines = _lock(
+                rows, tiles[placement.rotation], placement.x, placement.y, full_row
+            )
+            scored.append(
+                (self._evaluate(after, width, lines), placement, after, lines)
+            )
+        if not scored:
+            return None
+        scored.sort(key=lambda item: item[0], reverse=True)
+        if not self.lookahead:
+            return scored[0][1]
+
+        best, best_score = scored[0][1], None
+        for _score, placement, after, lines in scored[: self.beam]:
+            score = self._best_drop(after, width, full_row, tgame.next)
+            if score is None:  # the next piece won't fit
+                continue
+            score += self.weights.lines * lines
+            if best_score is None or score > best_score:
+                best, best_score = placement, score
+        return best
+
+    def play(self, tgame: Tetris) -> Events:
+        """Place the current tetrominoe at the best placement"""
+        placement = self.choose(tgame)
+        if placement is None:
+            return tgame.step(Action.DROP)
+        for action in placement.actions:
+            events = tgame.step(action)
+        return events
+
+    def policy(self, tgame: Tetris) -> Action:
+        """Returns the next action of the plan for the current tetrominoe,
+        the bot makes a new plan when a new tetrominoe spawned."""
+        if tgame.pieces != self._planned_piece or not self._plan:
+            placement = self.choose(tgame)
+            self._plan = list(placement.actions) if placement else [Action.DROP]
+            self._planned_piece = tgame.pieces
+        return self._plan.pop(0)
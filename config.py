@@ -1,10 +1,6 @@
 import logging
 import json
 import os
-import sys
-from pathlib import Path
-
-import pdb
 
 _XDG_CONFIG_HOME = "XDG_CONFIG_HOME"
 _APPDATA = "APPDATA"
@@ -16,7 +12,7 @@ class ConfigFile:
     """A class that represents a configuration file"""
 
     def __init__(self):
-        self.filename =self._get_filename()
+        self.filename = self._get_filename()
         dirname = os.path.dirname(self.filename)
         if os.path.exists(dirname):
             if not os.path.isdir(dirname):
@@ -24,12 +20,17 @@ class ConfigFile:
         else:
             os.makedirs(dirname)
 
+    @staticmethod
+    def dirname() -> str:
+        """Get and/or create the directory with the config data"""
+        return os.path.dirname(ConfigFile().filename)
+
 
     def read(self) -> dict:
         """Read the config file, might return empty dict
         when it wasn't present before."""
         ret = {}
-        filename = self._get_filename()
+        filename = self.filename
         try:
             logging.info(f"Trying to open {filename} for reading")
             with open(filename, 'r') as infile:
@@ -39,27 +40,31 @@ class ConfigFile:
         return ret
 
     def write(self, config:dict)->None:
-        """Read the config file, might return empty dict
-        when it wasn't present before."""
-        filename = self._get_filename()
-        logging.info(f"Trying to open {filename} for reading")
-        with open(filename, 'w') as outfile:
+        """Write the config file, the new contents replace the old file
+        at once, so a crash never leaves a partially written file."""
+        filename = self.filename
+        tempname = filename + ".tmp"
+        logging.info(f"Trying to open {tempname} for writing")
+        with open(tempname, 'w') as outfile:
             json.dump(config, outfile, indent=4)
+        os.replace(tempname, filename)
 
     @staticmethod
     def _get_filename()->str:
         """Get and/or create the config file name"""
+        # os.path is used instead of pathlib, which is slow to import
         filename = None
         if _XDG_CONFIG_HOME in os.environ:
-            filename = Path(os.environ[_XDG_CONFIG_HOME])
-            filename = filename / _DIRNAME / _CONF_FILE_NAME
+            filename = os.path.join(
+                os.environ[_XDG_CONFIG_HOME], _DIRNAME, _CONF_FILE_NAME
+            )
         elif _HOME in os.environ:
-            filename = Path(os.environ[_HOME])
-            filename = filename / ".config/" / _DIRNAME / _CONF_FILE_NAME
+            filename = os.path.join(
+                os.environ[_HOME], ".config", _DIRNAME, _CONF_FILE_NAME
+            )
         elif _APPDATA in os.environ:
-            filename = Path(os.environ[_APPDATA])
-            filename = filename / _DIRNAME / _CONF_FILE_NAME
+            filename = os.path.join(os.environ[_APPDATA], _DIRNAME, _CONF_FILE_NAME)
         else:
             raise RuntimeError("No suitable folder for config data found.")
 
-        return str(filename)
+        return filename
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Simulate games of Tetᴙis without curses or a wall clock"""
+
+import argparse as ap
+import random as r
+import time
+from typing import Callable, Dict, List, Optional
+
+from bot import Bot
+from tetris import Action, Tetris, DEFAULT_HEIGHT, DEFAULT_WIDTH
+
+# A policy picks the next action given the game
+Policy = Callable[[Tetris], Action]
+
+_RANDOM_ACTIONS = (Action.LEFT, Action.RIGHT, Action.DOWN, Action.ROTATE, Action.DROP)
+
+
+def random_policy(seed: Optional[int] = None) -> Policy:
+    """Returns a policy that picks a random action, the seed makes
+    the choices reproducible."""
+    rng = r.Random(seed)
+
+    def policy(_tgame: Tetris) -> Action:
+        return rng.choice(_RANDOM_ACTIONS)
+
+    return policy
+
+
+def play(
+    seed: int,
+    policy: Optional[Policy] = None,
+    max_steps: int = 100000,
+    style: str = "NTSC",
+    width: int = DEFAULT_WIDTH,
+    height: int = DEFAULT_HEIGHT,
+) -> Dict[str, int]:
+    """Play one game, every step is followed by a gravity tick. Returns
+    the statistics of the finished game."""
+    if policy is None:
+        policy = random_policy(seed)
+    tgame = Tetris(width, height, style=style, seed=seed)
+    steps = 0
+    while not tgame.game_over and steps < max_steps:
+        tgame.step(policy(tgame))
+        if not tgame.game_over:
+            tgame.tick()
+        steps += 1
+    return {
+        "seed": seed,
+        "score": tgame.score,
+        "lines": tgame.lines,
+        "level": tgame.level,
+        "pieces": tgame.pieces,
+        "steps": steps,
+    }
+
+
+def run(
+    num_games: int,
+    seed: int = 0,
+    policy: Optional[Callable[[], Policy]] = None,
+    max_steps: int = 100000,
+    width: int = DEFAULT_WIDTH,
+    height: int = DEFAULT_HEIGHT,
+) -> List[Dict[str, int]]:
+    """Play num_games with consecutive seeds, policy creates a new policy
+    for every game"""
+    return [
+        play(seed + i, policy() if policy else None, max_steps, "NTSC", width, height)
+        for i in range(num_games)
+    ]
+
+
+def main():
+    """Simulate a number of games and report the games per second"""
+    cmdparser = ap.ArgumentParser(
+        "headless", "Simulate games of Tetᴙis without a terminal"
+    )
+    cmdparser.add_argument(
+        "-n", "--num-games", type=int, default=1000, help="number of games to play"
+    )
+    cmdparser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    cmdparser.add_argument(
+        "--bot", action="store_true", help="let the bot play instead of random actions"
+    )
+    cmdparser.add_argument(
+        "--max-steps", type=int, default=100000, help="maximum number of steps per game"
+    )
+    cmdparser.add_argument(
+        "--width", type=int, default=DEFAULT_WIDTH, help="number of columns"
+    )
+    cmdparser.add_argument(
+        "--height", type=int, default=DEFAULT_HEIGHT, help="number of rows"
+    )
+    args = cmdparser.parse_args()
+
+    policy = (lambda: Bot().policy) if args.bot else None
+    start = time.perf_counter()
+    results = run(
+        args.num_games, args.seed, policy, args.max_steps, args.width, args.height
+    )
+    duration = time.perf_counter() - start
+
+    steps = sum(result["steps"] for result in results)
+    pieces = sum(result["pieces"] for result in results)
+    lines = sum(result["lines"] for result in results)
+    print(
+        f"games = {len(results)}, pieces = {pieces}, steps = {steps}, lines = {lines}"
+    )
+    print(f"duration = {duration:.3f}s")
+    print(f"games/s = {len(results) / duration:.1f}")
+    print(f"steps/s = {steps / duration:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -70,3 +70,10 @@ PAL_NF_DESCENT = {
 
 for i in range(19, 300):
     PAL_NF_DESCENT[i] = 1
+
+# Delayed auto shift: frames a held left or right key waits before the
+# tetrominoe starts shifting and frames between the following shifts
+NTSC_DAS_DELAY = 16
+NTSC_DAS_REPEAT = 6
+PAL_DAS_DELAY = 12
+PAL_DAS_REPEAT = 4
@@ -0,0 +1,92 @@
+"""Fixed size histograms for timing the phases of every frame"""
+
+import math
+from array import array
+from typing import Dict, Iterable
+
+PERCENTS = (50, 90, 99, 99.9)
+
+
+class Histogram:
+    """Counts durations in logarithmic buckets, the memory use doesn't
+    grow with the number of samples. Percentiles are accurate to the
+    width of a bucket, about 12% with the default of 20 buckets per
+    decade."""
+
+    def __init__(self, low: float = 1e-6, high: float = 10.0, per_decade: int = 20):
+        self._low = low
+        self._per_decade = per_decade
+        self._scale = per_decade / math.log(10)
+        self._num_buckets = math.ceil(math.log10(high / low) * per_decade) + 1
+        # bucket 0 holds everything below low
+        self._counts = array("Q", [0]) * (self._num_buckets + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        """Add one duration in seconds"""
+        if value < self._low:
+            index = 0
+        else:
+            index = min(
+                self._num_buckets, int(math.log(value / self._low) * self._scale) + 1
+            )
+        self._counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent: float) -> float:
+        """The upper edge of the bucket that holds the percentile"""
+        if not self.count:
+            return 0.0
+        wanted = self.count * percent / 100
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= wanted and count:
+                if index == 0:
+                    return self._low
+                return min(self.max, self._low * 10 ** (index / self._per_decade))
+        return self.max
+
+    def summary(self, percents: Iterable[float] = PERCENTS) -> Dict[str, float]:
+        """Count, mean, percentiles and maximum in seconds"""
+        summary = {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+        }
+        for percent in percents:
+            summary[f"p{percent:g}"] = self.percentile(percent)
+        summary["max"] = self.max
+        return summary
+
+
+class FrameProfile:
+    """Histograms for the phases of the game loop"""
+
+    PHASES = ("input", "simulation", "render", "latency")
+
+    def __init__(self):
+        self.histograms = {phase: Histogram() for phase in self.PHASES}
+
+    def add(self, phase: str, duration: float) -> None:
+        """Add the duration of one phase of a frame"""
+        self.histograms[phase].add(duration)
+
+    def report(self) -> str:
+        """One line with the percentiles per phase in milliseconds"""
+        lines = []
+        for phase, histogram in self.histograms.items():
+            stats = ", ".join(
+                (
+                    f"{key} = {value:g}"
+                    if key == "count"
+                    else f"{key} = {value * 1000:.3f}ms"
+                )
+                for key, value in histogram.summary().items()
+            )
+            lines.append(f"{phase:10}: {stats}")
+        return "\n".join(lines)
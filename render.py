@@ -0,0 +1,118 @@
+"""Draw text frames and frame buffers in curses windows, only writing
+what has changed"""
+
+import curses
+from typing import Dict, List
+
+from tetris import FrameBuffer, board_line, tile_line
+
+
+class WindowRenderer:
+    """Remembers the last frame drawn in a window, when a new frame is
+    drawn only the changed part of every line is written. Characters
+    with the same attribute are written with one addstr."""
+
+    def __init__(self, win, attrs: Dict[str, int]):
+        self._win = win
+        self._attrs = attrs
+        self._last: List[str] = []
+
+    def _attr(self, char: str) -> int:
+        return self._attrs.get(char, 0)
+
+    def _write(self, row: int, col: int, text: str) -> None:
+        """Write text in runs of characters with equal attributes"""
+        start = 0
+        attr = self._attr(text[0])
+        for index in range(1, len(text)):
+            next_attr = self._attr(text[index])
+            if next_attr != attr:
+                self._addstr(row, col + start, text[start:index], attr)
+                start, attr = index, next_attr
+        self._addstr(row, col + start, text[start:], attr)
+
+    def _addstr(self, row: int, col: int, text: str, attr: int) -> None:
+        try:
+            self._win.addstr(row, col, text, attr)
+        except curses.error:
+            # Writing the bottom right cell moves the cursor out of the window
+            pass
+
+    def draw(self, frame: str) -> bool:
+        """Update the window to show frame, the changes are staged with
+        noutrefresh, call curses.doupdate to show them. Returns whether
+        something has changed."""
+        return self._draw_lines(frame.split("\n"))
+
+    def draw_board(self, frame: FrameBuffer) -> bool:
+        """Like draw(str(tgame)) with the frame buffer of a game, but only
+        the dirty rows of the buffer are built and compared. The dirty
+        rows are taken from the buffer."""
+        if len(self._last) != frame.height + 2:  # the first or a new board
+            bar = "-" * (frame.width * 2 + 1)
+            frame.dirty.clear()
+            lines = [board_line(frame.colors(row)) for row in range(frame.height)]
+            return self._draw_lines([bar, *lines, bar])
+        changed = False
+        for row in frame.take_dirty():
+            line = board_line(frame.colors(row))
+            changed |= self._update_line(row + 1, line, self._last[row + 1])
+            self._last[row + 1] = line
+        if changed:
+            self._win.noutrefresh()
+        return changed
+
+    def draw_piece(self, frame: FrameBuffer) -> bool:
+        """Like draw(str(tetrominoe)) with the frame buffer of a tile"""
+        return self._draw_lines(
+            [tile_line(frame.colors(row)) for row in range(frame.height)]
+        )
+
+    def _draw_lines(self, lines: List[str]) -> bool:
+        last = self._last
+        changed = False
+
+        for row, line in enumerate(lines):
+            old = last[row] if row < len(last) else ""
+            changed |= self._update_line(row, line, old)
+
+        for row in range(len(lines), len(last)):
+            changed = True
+            self._erase(row, 0)
+
+        self._last = lines
+        if changed:
+            self._win.noutrefresh()
+        return changed
+
+    def _update_line(self, row: int, line: str, old: str) -> bool:
+        """Write the part of line that differs from old, returns whether
+        they differ"""
+        if line == old:
+            return False
+        # Only write from the first to the last changed column
+        first = 0
+        shortest = min(len(line), len(old))
+        while first < shortest and line[first] == old[first]:
+            first += 1
+        end = len(line)
+        if len(old) == end:
+            while end > first and line[end - 1] == old[end - 1]:
+                end -= 1
+        if end > first:
+            self._write(row, first, line[first:end])
+        if len(line) < len(old):
+            self._erase(row, len(line))
+        return True
+
+    def _erase(self, row: int, col: int) -> None:
+        try:
+            self._win.move(row, col)
+            self._win.clrtoeol()
+        except curses.error:
+            pass
+
+    def invalidate(self) -> None:
+        """Forget the last frame, so the next draw writes everything"""
+        self._last = []
+        self._win.erase()
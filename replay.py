@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""Record the input of a game of Tetᴙis and replay it without a terminal.
+
+A recording starts with a header holding the seed of the game. It is
+followed by one varint per input that holds the number of frames since
+the previous input and the action, so most inputs take one or two bytes.
+The final frame, score, lines and a checksum of the board are stored at
+the end, so a replay can verify that it ends in the same state.
+"""
+
+import argparse as ap
+import random as r
+import struct
+import sys
+import time
+import zlib
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from tetris import Action, Events, Tetris, board_line
+
+_MAGIC = b"ATR1"
+_HEADER = struct.Struct("<4sBQHH")  # magic, style, seed, width, height
+_STYLES = ["NTSC", "PAL"]
+_ACTION_BITS = 3
+_END = 7  # Marks the end of the inputs, not a valid Action
+
+
+class Recording(NamedTuple):
+    """The contents of a recording file"""
+
+    style: str
+    seed: int
+    width: int
+    height: int
+    inputs: List[Tuple[int, Action]]  # (frame, action) pairs
+    frames: int
+    score: int
+    lines: int
+    checksum: int
+
+
+def board_checksum(tgame: Tetris) -> int:
+    """A checksum of the board as str draws it without the ghost, which
+    only shows while playing and isn't replayed"""
+    bar = "-" * (tgame.width * 2 + 1)
+    lines = [board_line(row) for row in tgame.cells()]
+    return zlib.crc32("\n".join([bar, *lines, bar]).encode())
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """Returns the value and the position after it"""
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class Recorder:
+    """Collects the input of one game"""
+
+    def __init__(self, tgame: Tetris):
+        if tgame.seed is None:
+            raise ValueError("Only games with a seed can be recorded")
+        self._data = bytearray(
+            _HEADER.pack(
+                _MAGIC,
+                _STYLES.index(tgame.style),
+                tgame.seed,
+                tgame.width,
+                tgame.height,
+            )
+        )
+        self._last_frame = 0
+
+    def record(self, frame: int, action: Action) -> None:
+        """Store that action was taken before the given frame"""
+        _write_varint(self._data, (frame - self._last_frame) << _ACTION_BITS | action)
+        self._last_frame = frame
+
+    def finish(self, tgame: Tetris) -> bytes:
+        """Returns the recording of the finished game"""
+        data = bytearray(self._data)
+        data.append(_END)
+        for value in (tgame.frames, tgame.score, tgame.lines):
+            _write_varint(data, value)
+        data += struct.pack("<I", board_checksum(tgame))
+        return bytes(data)
+
+    def save(self, filename: str, tgame: Tetris) -> None:
+        """Write the recording of the finished game to filename"""
+        with open(filename, "wb") as outfile:
+            outfile.write(self.finish(tgame))
+
+
+def parse(data: bytes) -> Recording:
+    """Parses the contents of a recording file"""
+    magic, style, seed, width, height = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError("This isn't a recording of ascii-tetris")
+    pos = _HEADER.size
+    inputs = []
+    frame = 0
+    while data[pos] != _END:
+        value, pos = _read_varint(data, pos)
+        frame += value >> _ACTION_BITS
+        inputs.append((frame, Action(value & (1 << _ACTION_BITS) - 1)))
+    pos += 1
+    frames, pos = _read_varint(data, pos)
+    score, pos = _read_varint(data, pos)
+    lines, pos = _read_varint(data, pos)
+    (checksum,) = struct.unpack_from("<I", data, pos)
+    return Recording(
+        _STYLES[style], seed, width, height, inputs, frames, score, lines, checksum
+    )
+
+
+def load(filename: str) -> Recording:
+    """Read a recording file"""
+    with open(filename, "rb") as infile:
+        return parse(infile.read())
+
+
+def replay(
+    recording: Recording,
+    stop: Optional[int] = None,
+    on_events: Optional[Callable[[Tetris, Events], None]] = None,
+) -> Tetris:
+    """Play the recorded game again as fast as possible, or up to the
+    frame stop and the inputs of that frame. on_events is called after
+    every input and every fall of the tetrominoe."""
+    tgame = Tetris(
+        recording.width, recording.height, recording.style, seed=recording.seed
+    )
+    end = recording.frames if stop is None else stop
+    for frame, action in recording.inputs:
+        if frame > end:
+            break
+        _advance(tgame, frame, on_events)
+        if tgame.game_over:
+            break
+        events = tgame.step(action)
+        if on_events is not None:
+            on_events(tgame, events)
+    _advance(tgame, end, on_events)
+    return tgame
+
+
+def _advance(
+    tgame: Tetris, frame: int, on_events: Optional[Callable[[Tetris, Events], None]]
+) -> None:
+    """Run the frames up to frame, or until the game is over"""
+    while tgame.frames < frame and not tgame.game_over:
+        events = tgame.frame()
+        if events is not None and on_events is not None:
+            on_events(tgame, events)
+
+
+def verify(recording: Recording) -> bool:
+    """Replay a recording and check that it ends in the recorded state"""
+    tgame = replay(recording)
+    return (
+        tgame.frames == recording.frames
+        and tgame.score == recording.score
+        and tgame.lines == recording.lines
+        and board_checksum(tgame) == recording.checksum
+    )
+
+
+def random_recording(seed: int, width: int = 10, height: int = 20) -> Recording:
+    """Record a game of random inputs, for benchmarks and trying out
+    archives"""
+    tgame = Tetris(width, height, seed=seed)
+    recorder = Recorder(tgame)
+    rng = r.Random(seed)
+    actions = (Action.LEFT, Action.RIGHT, Action.DOWN, Action.ROTATE, Action.DROP)
+    while not tgame.game_over:
+        if rng.random() < 0.05:
+            action = rng.choice(actions)
+            recorder.record(tgame.frames, action)
+            tgame.step(action)
+        if not tgame.game_over:
+            tgame.frame()
+    return parse(recorder.finish(tgame))
+
+
+def main():
+    """Replay recordings and check whether they end as recorded"""
+    cmdparser = ap.ArgumentParser(
+        "replay", "Replay recorded games of Tetᴙis and verify them"
+    )
+    cmdparser.add_argument("recordings", nargs="+", help="the recordings to replay")
+    args = cmdparser.parse_args()
+
+    failures = frames = 0
+    start = time.perf_counter()
+    for filename in args.recordings:
+        recording = load(filename)
+        frames += recording.frames
+        if not verify(recording):
+            failures += 1
+            print(f"{filename}: doesn't match the recording")
+    duration = time.perf_counter() - start
+
+    print(f"recordings = {len(args.recordings)}, failures = {failures}")
+    print(f"frames/s = {frames / duration:.0f}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
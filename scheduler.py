@@ -0,0 +1,115 @@
+"""Run a simulation in whole frames of a fixed duration"""
+
+import contextlib
+import gc
+import time
+from array import array
+from typing import Callable, Dict, Iterable
+
+GC_MODES = ["on", "freeze", "off"]
+
+
+class FrameScheduler:
+    """Keeps track of the frames that are due on a monotonic clock.
+
+    The deadline of frame n is computed as start + n * frame_dur, so
+    rounding errors don't accumulate. After a stall at most max_catchup
+    frames more than planned are run at once, the other frames are
+    dropped, so a slow frame can't make the next frames slower and
+    slower.
+    """
+
+    def __init__(
+        self,
+        frame_dur: float,
+        max_catchup: int = 4,
+        clock: Callable[[], float] = time.monotonic,
+        num_samples: int = 4096,
+    ):
+        self.frame_dur = frame_dur
+        self.max_catchup = max_catchup
+        self._clock = clock
+        self._start = clock()
+        self.frame = 0  # number of frames that were due so far
+        self.dropped = 0
+        self._planned = 1  # frames the caller intends to wait for
+        # Ring buffer with how late frames were handled, in seconds
+        self._lateness = array("d", [0.0]) * num_samples
+        self._num_lateness = 0
+
+    def reset(self) -> None:
+        """Start counting frames from now, e.g. after a pause"""
+        self._start = self._clock() - self.frame * self.frame_dur
+
+    def deadline(self, frames_ahead: int = 1) -> float:
+        """The clock time at which a future frame is due"""
+        return self._start + (self.frame + frames_ahead) * self.frame_dur
+
+    def time_until(self, frames_ahead: int = 1) -> float:
+        """Seconds until a future frame is due, 0 when it is overdue"""
+        self._planned = max(1, frames_ahead)
+        return max(0.0, self.deadline(frames_ahead) - self._clock())
+
+    def due(self) -> int:
+        """Returns the number of frames that should be run now"""
+        now = self._clock()
+        behind = int((now - self._start) / self.frame_dur) - self.frame
+        if behind <= 0:
+            return 0
+
+        self._record_lateness(now - self.deadline(behind))
+        limit = self._planned + self.max_catchup
+        self._planned = 1
+        if behind > limit:
+            skipped = behind - limit
+            self.dropped += skipped
+            self._start += skipped * self.frame_dur
+            behind = limit
+        self.frame += behind
+        return behind
+
+    def _record_lateness(self, lateness: float) -> None:
+        self._lateness[self._num_lateness % len(self._lateness)] = lateness
+        self._num_lateness += 1
+
+    def percentiles(self, percents: Iterable[float] = (50, 90, 99, 100)) -> Dict:
+        """Percentiles of how late the recent frames were handled in
+        seconds"""
+        samples = sorted(self._lateness[: min(self._num_lateness, len(self._lateness))])
+        if not samples:
+            return {percent: 0.0 for percent in percents}
+        return {
+            percent: samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+            for percent in percents
+        }
+
+    def report(self) -> str:
+        """A human readable summary of the frame timing"""
+        stats = ", ".join(
+            f"p{percent:g} = {value * 1000:.2f}ms"
+            for percent, value in self.percentiles().items()
+        )
+        return f"frames = {self.frame}, dropped = {self.dropped}, lateness: {stats}"
+
+
+@contextlib.contextmanager
+def gc_mode(mode: str):
+    """Run a block with the garbage collector on, frozen or off.
+
+    Frozen moves everything allocated so far into the permanent
+    generation, so collections during the block have less to scan.
+    """
+    if mode not in GC_MODES:
+        raise ValueError(f"mode should be one of {GC_MODES}")
+    if mode == "freeze":
+        gc.collect()
+        gc.freeze()
+    elif mode == "off":
+        gc.disable()
+    try:
+        yield
+    finally:
+        if mode == "freeze":
+            gc.unfreeze()
+        elif mode == "off":
+            gc.enable()
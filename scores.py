@@ -0,0 +1,120 @@
+"""A leaderboard of Tetᴙis scores stored in a SQLite database"""
+
+import datetime
+import os
+import sqlite3
+from typing import List, NamedTuple, Optional
+
+from config import ConfigFile
+
+_DB_NAME = "scores.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    id INTEGER PRIMARY KEY,
+    player TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    lines INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    style TEXT NOT NULL,
+    date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scores_by_style ON scores (style, score DESC);
+CREATE INDEX IF NOT EXISTS scores_by_player ON scores (player, style, score DESC);
+"""
+
+_COLUMNS = "player, score, lines, level, style, date"
+
+
+class Entry(NamedTuple):
+    """One finished game on the leaderboard"""
+
+    player: str
+    score: int
+    lines: int
+    level: int
+    style: str
+    date: str
+
+
+class HighScores:
+    """The leaderboard, every insert is its own transaction so a crash
+    can't leave a half written entry behind. The indices keep the top N
+    and personal best queries fast with many entries."""
+
+    def __init__(self, filename: Optional[str] = None):
+        if filename is None:
+            filename = os.path.join(ConfigFile.dirname(), _DB_NAME)
+        self.filename = filename
+        self._conn = sqlite3.connect(filename)
+        # The write ahead log lets readers continue while a game is saved
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """Close the database"""
+        self._conn.close()
+
+    def add(
+        self,
+        player: str,
+        score: int,
+        lines: int,
+        level: int,
+        style: str,
+        date: Optional[str] = None,
+    ) -> Entry:
+        """Store a finished game, date defaults to now"""
+        if date is None:
+            date = datetime.datetime.now(datetime.timezone.utc).isoformat(
+                timespec="seconds"
+            )
+        entry = Entry(player, score, lines, level, style, date)
+        with self._conn:
+            self._conn.execute(
+                f"INSERT INTO scores ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)", entry
+            )
+        return entry
+
+    def top(self, style: str, num: int = 10) -> List[Entry]:
+        """The best num entries for a style"""
+        rows = self._conn.execute(
+            f"SELECT {_COLUMNS} FROM scores WHERE style = ? "
+            "ORDER BY score DESC LIMIT ?",
+            (style, num),
+        )
+        return [Entry(*row) for row in rows]
+
+    def best(self, style: str) -> Optional[Entry]:
+        """The high score of a style"""
+        entries = self.top(style, 1)
+        return entries[0] if entries else None
+
+    def personal_best(self, player: str, style: str) -> Optional[Entry]:
+        """The best entry of one player for a style"""
+        row = self._conn.execute(
+            f"SELECT {_COLUMNS} FROM scores WHERE player = ? AND style = ? "
+            "ORDER BY score DESC LIMIT 1",
+            (player, style),
+        ).fetchone()
+        return Entry(*row) if row else None
+
+    def rank(self, score: int, style: str) -> int:
+        """The position a score would get on the leaderboard, 1 is best"""
+        (higher,) = self._conn.execute(
+            "SELECT COUNT(*) FROM scores WHERE style = ? AND score > ?",
+            (style, score),
+        ).fetchone()
+        return higher + 1
+
+    def is_empty(self) -> bool:
+        """Whether no game has been stored yet"""
+        return self._conn.execute("SELECT 1 FROM scores LIMIT 1").fetchone() is None
+
+    def import_config(self, config: dict, style: str = "NTSC") -> None:
+        """Move the single high score of older versions into an empty
+        leaderboard"""
+        old = config.get("score", {})
+        if old.get("highscore", 0) > 0 and self.is_empty():
+            self.add(old.get("player", ""), old["highscore"], 0, 0, style, "")
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""Host many games of Tetᴙis in one process, players connect over TCP.
+
+The protocol is line based, so telnet or nc will do. Every line holds one
+or more commands separated by spaces, like "a a w x". The board is sent
+back as ANSI escape sequences, only the rows that changed since the
+previous update are written.
+
+All games run in one asyncio event loop. Gravity doesn't need a loop per
+game: the next fall of every game is kept in one heap, and a single timer
+of the event loop fires at the earliest one. A game that is inactive
+costs nothing but its entry in the heap.
+"""
+
+import argparse as ap
+import asyncio
+import heapq
+import itertools
+import logging as log
+import random as r
+import time
+from typing import List, Optional, Tuple
+
+from tetris import Action, Tetris, DEFAULT_HEIGHT, DEFAULT_WIDTH, board_line
+
+_ADDRESS = "localhost:7374"
+
+# Commands, with a short alias for every action
+_COMMANDS = {
+    "left": Action.LEFT,
+    "a": Action.LEFT,
+    "right": Action.RIGHT,
+    "d": Action.RIGHT,
+    "down": Action.DOWN,
+    "s": Action.DOWN,
+    "rotate": Action.ROTATE,
+    "w": Action.ROTATE,
+    "drop": Action.DROP,
+    "x": Action.DROP,
+    "quit": Action.QUIT,
+    "q": Action.QUIT,
+}
+
+_HELP = "a/left d/right s/down w/rotate x/drop q/quit, then press enter"
+
+# Longest line a player may send, longer lines close the connection
+_MAX_LINE = 256
+# Nothing is sent while more than this is waiting to be sent, and the
+# commands of a player aren't read, so a slow player can't make the
+# server buffer without a bound
+_MAX_BUFFERED = 16384
+
+
+class GravityTimers:
+    """The time of the next fall of every game in one heap, with one timer
+    of the event loop for the earliest. Closed sessions are dropped when
+    their entry comes up."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._heap: List[Tuple[float, int, "Session"]] = []
+        self._order = itertools.count()  # sessions are never compared
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._armed_at = float("inf")
+        self.ticks = 0
+        self.max_lateness = 0.0  # seconds, since the last reset_stats
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, when: float, session: "Session") -> None:
+        """Let a session fall at a time of the event loop clock"""
+        heapq.heappush(self._heap, (when, next(self._order), session))
+        if when < self._armed_at:
+            self._arm(when)
+
+    def _arm(self, when: float) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+        self._handle = self._loop.call_at(when, self._fire)
+        self._armed_at = when
+
+    def _fire(self) -> None:
+        """Make every game that is due fall"""
+        self._handle = None
+        self._armed_at = float("inf")
+        heap = self._heap
+        now = self._loop.time()
+        while heap and heap[0][0] <= now:
+            when, _, session = heapq.heappop(heap)
+            if session.closed:
+                continue
+            self.ticks += 1
+            self.max_lateness = max(self.max_lateness, now - when)
+            session.fall(when, now)
+        if heap:
+            self._arm(heap[0][0])
+
+    def reset_stats(self) -> None:
+        self.ticks = 0
+        self.max_lateness = 0.0
+
+
+class Session:
+    """One player and its game"""
+
+    __slots__ = ("tgame", "_writer", "_timers", "_score", "closed")
+
+    def __init__(
+        self, tgame: Tetris, writer: asyncio.StreamWriter, timers: GravityTimers
+    ):
+        self.tgame = tgame
+        self._writer = writer
+        self._timers = timers
+        self._score: Optional[Tuple[int, int, int]] = None  # as last sent
+        self.closed = False
+
+    def start(self, now: float) -> None:
+        """Clear the screen of the player, draw the game and start its
+        gravity"""
+        self._send(f"\x1b[2J\x1b[H{_HELP}\r\n")
+        self.update()
+        self._timers.schedule(now + self.tgame.fall_duration, self)
+
+    def handle(self, line: str) -> None:
+        """Take the actions of a line of commands"""
+        tgame = self.tgame
+        for word in line.split():
+            action = _COMMANDS.get(word.lower())
+            if action is None:
+                self._message(f"Unknown command {word[:20]!r}, {_HELP}")
+                continue
+            tgame.step(action)
+            if tgame.game_over:
+                break
+        self.update()
+
+    def fall(self, when: float, now: float) -> None:
+        """Gravity of the game, called by the timers when it is due"""
+        tgame = self.tgame
+        tgame.tick()
+        self.update()
+        if self.closed:
+            return
+        # Count from the planned time, so the falls don't drift, unless
+        # the server is so far behind that falls would pile up
+        when = max(when + tgame.fall_duration, now)
+        self._timers.schedule(when, self)
+
+    def update(self) -> None:
+        """Send the rows of the board that changed, or the result when the
+        game is over"""
+        if self.closed:
+            return
+        tgame = self.tgame
+        out = []
+        # While the player doesn't keep up the changed rows stay dirty
+        if self._writable():
+            frame = tgame.frame_buffer()
+            for row in frame.take_dirty():
+                # Row 1 holds the help, row 2 the top bar of the board
+                out.append(f"\x1b[{row + 3};1H{board_line(frame.colors(row))}")
+            score = (tgame.score, tgame.lines, tgame.level)
+            if score != self._score:
+                self._score = score
+                bar = "-" * (tgame.width * 2 + 1)
+                out.append(f"\x1b[2;1H{bar}\x1b[{tgame.height + 3};1H{bar}")
+                out.append(
+                    f"\x1b[{tgame.height + 4};1H\x1b[KScore: {tgame.score}"
+                    f"  Lines: {tgame.lines}  Level: {tgame.level}"
+                )
+        if tgame.game_over:
+            out.append(f"\x1b[{tgame.height + 5};1H\x1b[KGame over\r\n")
+        if out:
+            self._send("".join(out))
+        if tgame.game_over:
+            self.close()
+
+    def _message(self, text: str) -> None:
+        row = self.tgame.height + 5
+        self._send(f"\x1b[{row};1H\x1b[K{text}")
+
+    def _writable(self) -> bool:
+        return self._writer.transport.get_write_buffer_size() <= _MAX_BUFFERED
+
+    def _send(self, text: str) -> None:
+        """Write to the player, dropped while too much is waiting"""
+        if self._writable():
+            self._writer.write(text.encode())
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self._writer.close()
+
+
+class SessionServer:
+    """Accepts players and runs a game for each of them"""
+
+    def __init__(
+        self,
+        max_sessions: int = 10000,
+        style: str = "NTSC",
+        width: int = DEFAULT_WIDTH,
+        height: int = DEFAULT_HEIGHT,
+        seed: Optional[int] = None,
+    ):
+        self.max_sessions = max_sessions
+        self.style = style
+        self.width, self.height = width, height
+        # Games get consecutive seeds, or random ones without a seed
+        self._seeds = itertools.count(seed) if seed is not None else None
+        self.sessions = 0
+        self.games = 0
+        self.timers: Optional[GravityTimers] = None
+
+    def _seed(self) -> int:
+        if self._seeds is None:
+            return r.getrandbits(64)
+        return next(self._seeds)
+
+    async def serve(self, address: str, stats_interval: float = 0.0) -> None:
+        """Accept players on host:port until cancelled"""
+        loop = asyncio.get_running_loop()
+        self.timers = GravityTimers(loop)
+        host, _, port = address.rpartition(":")
+        server = await asyncio.start_server(
+            self._play, host or "localhost", int(port), limit=_MAX_LINE
+        )
+        log.info("Serving on %s", address)
+        async with server:
+            if stats_interval > 0:
+                stats = loop.create_task(self._log_stats(stats_interval))
+            try:
+                await server.serve_forever()
+            finally:
+                if stats_interval > 0:
+                    stats.cancel()
+
+    async def _play(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        if self.sessions >= self.max_sessions:
+            writer.write(b"The server is full, try again later\r\n")
+            writer.close()
+            return
+        tgame = Tetris(self.width, self.height, self.style, seed=self._seed())
+        session = Session(tgame, writer, self.timers)
+        self.sessions += 1
+        self.games += 1
+        # Drain waits while more than _MAX_BUFFERED is waiting to be sent
+        writer.transport.set_write_buffer_limits(high=_MAX_BUFFERED)
+        try:
+            session.start(asyncio.get_running_loop().time())
+            while not session.closed:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):  # too long or reset
+                    break
+                if not line:
+                    break
+                session.handle(line.decode(errors="replace"))
+                try:
+                    await writer.drain()
+                except ConnectionError:
+                    break
+        finally:
+            session.close()
+            self.sessions -= 1
+
+    async def _log_stats(self, interval: float) -> None:
+        """Log the number of sessions and the gravity ticks regularly"""
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            timers = self.timers
+            log.info(
+                "sessions = %d, games = %d, ticks/s = %.1f, "
+                "max tick latency = %.1fms",
+                self.sessions,
+                self.games,
+                timers.ticks / (now - last),
+                timers.max_lateness * 1000,
+            )
+            timers.reset_stats()
+            last = now
+
+
+def main():
+    """Run the server until it is interrupted"""
+    cmdparser = ap.ArgumentParser(
+        "server", "Host games of Tetᴙis for players that connect over TCP"
+    )
+    cmdparser.add_argument(
+        "address",
+        nargs="?",
+        default=_ADDRESS,
+        help=f"host:port to listen on, defaults to {_ADDRESS}",
+    )
+    cmdparser.add_argument(
+        "--max-sessions",
+        type=int,
+        default=10000,
+        help="number of games that may be played at the same time",
+    )
+    cmdparser.add_argument(
+        "-s",
+        "--style",
+        choices=Tetris.styles,
+        default="NTSC",
+        help="speed of the games",
+    )
+    cmdparser.add_argument(
+        "--width", type=int, default=DEFAULT_WIDTH, help="number of columns"
+    )
+    cmdparser.add_argument(
+        "--height", type=int, default=DEFAULT_HEIGHT, help="number of rows"
+    )
+    cmdparser.add_argument(
+        "--seed", type=int, help="seed of the first game, the next get the next seeds"
+    )
+    cmdparser.add_argument(
+        "--stats",
+        type=float,
+        default=10.0,
+        help="seconds between the statistics that are logged, 0 for none",
+    )
+    args = cmdparser.parse_args()
+
+    log.basicConfig(level=log.INFO, format="%(asctime)s %(message)s")
+    server = SessionServer(
+        args.max_sessions, args.style, args.width, args.height, args.seed
+    )
+    try:
+        asyncio.run(server.serve(args.address, args.stats))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
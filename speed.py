@@ -0,0 +1,72 @@
+"""Speed curves, how many frames a tetrominoe takes to fall one row at
+every level.
+
+A custom curve is a JSON file like
+{"name": "Marathon", "fps": 60.0988, "fall_frames": [48, 43, 38, 33, 1]}
+where the last number of fall_frames holds for all higher levels. The
+optional "das_delay" and "das_repeat" set the auto shift of a held key in
+frames, they default to the NTSC values.
+"""
+
+import json
+from typing import Dict, NamedTuple, Tuple
+
+import nesdata as nd
+
+
+class SpeedCurve(NamedTuple):
+    """The frame duration of the emulated console and the frames per row
+    for every level, the last entry holds for all higher levels. A held
+    left or right key shifts after das_delay frames and then every
+    das_repeat frames."""
+
+    name: str
+    frame_duration: float
+    fall_frames: Tuple[int, ...]
+    das_delay: int = nd.NTSC_DAS_DELAY
+    das_repeat: int = nd.NTSC_DAS_REPEAT
+
+    def frames(self, level: int) -> int:
+        """The number of frames it takes to fall one row at a level"""
+        if level < len(self.fall_frames):
+            return self.fall_frames[level]
+        return self.fall_frames[-1]
+
+
+def _table(descent: Dict[int, int]) -> Tuple[int, ...]:
+    """The values of a nesdata dict as a tuple indexed by level"""
+    return tuple(descent[level] for level in range(len(descent)))
+
+
+CURVES = {
+    "NTSC": SpeedCurve("NTSC", nd.NTSC_FRAME_DUR, _table(nd.NTSC_NF_DESCENT)),
+    "PAL": SpeedCurve(
+        "PAL",
+        nd.PAL_FRAME_DUR,
+        _table(nd.PAL_NF_DESCENT),
+        nd.PAL_DAS_DELAY,
+        nd.PAL_DAS_REPEAT,
+    ),
+}
+
+
+def load_curve(filename: str) -> SpeedCurve:
+    """Read a custom speed curve from a JSON file"""
+    with open(filename) as infile:
+        data = json.load(infile)
+    try:
+        name = str(data["name"])
+        fps = float(data["fps"])
+        fall_frames = tuple(int(frames) for frames in data["fall_frames"])
+        das_delay = int(data.get("das_delay", nd.NTSC_DAS_DELAY))
+        das_repeat = int(data.get("das_repeat", nd.NTSC_DAS_REPEAT))
+    except (KeyError, TypeError, ValueError) as error:
+        raise ValueError(f"{filename} isn't a valid speed curve: {error}") from error
+    if name in CURVES:
+        raise ValueError(f"The name of a custom speed curve can't be {name}")
+    if fps <= 0 or not fall_frames or min(fall_frames + (das_delay, das_repeat)) < 1:
+        raise ValueError(
+            f"{filename} isn't a valid speed curve: fps, fall_frames, "
+            "das_delay and das_repeat should be positive"
+        )
+    return SpeedCurve(name, 1.0 / fps, fall_frames, das_delay, das_repeat)
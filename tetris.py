@@ -1,27 +1,66 @@
 """Classes helpfull to implement Tetris"""
 
-from typing import List
+from enum import IntEnum
+from bisect import bisect_left
+from typing import Iterable, List, NamedTuple, Optional, Set, Tuple
 import random as r
-import copy
-import nesdata as nd
+from speed import CURVES, SpeedCurve
 import logging as log
 
 
+def _init_frozen(obj, **attrs) -> None:
+    """Set the attributes of an immutable object"""
+    for name, value in attrs.items():
+        object.__setattr__(obj, name, value)
+
+
 class Tile:
-    """A tile represents one of the faces of a Tetrominoe"""
+    """A tile represents one of the faces of a Tetrominoe. Tiles are
+    immutable, so every game shares the same ones."""
+
+    __slots__ = ("height", "width", "boolarray", "rowmasks", "colrows", "bottoms")
 
     def __init__(self, boolarray: List[List[int]]):
-        self.height = 0
-        self.width = 0
+        height, width = self._validate_boolarray(boolarray)
+        array = tuple(tuple(row) for row in boolarray)
+        # One bitmask per row, bit n is set when column n is occupied. These
+        # are shifted by the horizontal position of the tile on the board.
+        rowmasks = tuple(
+            sum(1 << col for col, cell in enumerate(row) if cell) for row in array
+        )
+        # The occupied rows of every column, from the top to the bottom
+        colrows = tuple(
+            tuple(row for row in range(height) if array[row][col])
+            for col in range(width)
+        )
+        _init_frozen(
+            self,
+            height=height,
+            width=width,
+            boolarray=array,
+            rowmasks=rowmasks,
+            colrows=colrows,
+            # The lowest occupied row of every column
+            bottoms=tuple(rows[-1] for rows in colrows),
+        )
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Tile is immutable")
+
+    def __copy__(self):
+        return self
 
-        self._validate_boolarray(boolarray)
-        self.boolarray = boolarray
+    def __deepcopy__(self, _memo):
+        return self
+
+    def __reduce__(self):
+        return Tile, ([list(row) for row in self.boolarray],)
 
     def __repr__(self) -> str:
-        return "Tile(" + repr(self.boolarray) + ")"
+        return "Tile(" + repr([list(row) for row in self.boolarray]) + ")"
 
     @property
-    def array(self) -> List[List[int]]:
+    def array(self) -> Tuple[Tuple[int, ...], ...]:
         """short for self.boolarray"""
         return self.boolarray
 
@@ -30,103 +69,173 @@ class Tile:
             return True
         if not isinstance(rhs, Tile):
             return False
-        return (
-            self.height == rhs.height
-            and self.width == rhs.width
-            and self.array == rhs.array
-        )
+        return self.array == rhs.array
 
-    def _validate_boolarray(self, arr):
+    def __hash__(self) -> int:
+        return hash(self.boolarray)
+
+    @staticmethod
+    def _validate_boolarray(arr) -> Tuple[int, int]:
+        """Returns the height and width of a valid array"""
         typeerr_msg = "Array isn't a rectangular list of list of int"
         valid_numbers = [0, 1]
 
         if not isinstance(arr, list):
             raise TypeError(typeerr_msg)
 
-        self.height = len(arr)
+        height = len(arr)
+        width = 0
 
         for intlist in arr:
             if not isinstance(intlist, list):
                 raise TypeError(typeerr_msg)
-            if len(intlist) != self.width and self.width != 0:
+            if len(intlist) != width and width != 0:
                 raise ValueError("Arr isn't rectangular")
-            self.width = len(intlist)
+            width = len(intlist)
             for num in intlist:
                 if num not in valid_numbers:
                     raise ValueError("Oops expected rectangular array with 0's and 1's")
 
-        if not (0 < self.height < 5) and (0 < self.width < 5):
+        if not (0 < height < 5) and (0 < width < 5):
             raise ValueError(
                 "Width and height are should be between in the range [1,4]"
             )
+        return height, width
 
 
 class Tetrominoe:
-    """A class that represents the multiple faces of a Tetromino"""
+    """A class that represents the multiple faces of a Tetromino. The
+    tetrominoes are immutable and shared by every game, the rotation of
+    the falling one is kept in an ActivePiece."""
+
+    __slots__ = ("tiles", "color")
 
     def __init__(self, tiles: List[Tile], color: str):
-        self.rotation = 0
-        self.color = color
-        self.tiles = tiles
+        _init_frozen(self, tiles=tuple(tiles), color=color)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Tetrominoe is immutable")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, _memo):
+        return self
+
+    def __reduce__(self):
+        return Tetrominoe, (list(self.tiles), self.color)
 
     def __eq__(self, rhs) -> bool:
         if self is rhs:
             return True
         if not isinstance(rhs, Tetrominoe):
             return False
-        return (
-            self.rotation == rhs.rotation
-            and self.color == rhs.color
-            and self.tiles == rhs.tiles
-        )
+        return self.color == rhs.color and self.tiles == rhs.tiles
+
+    def __hash__(self) -> int:
+        return hash((self.tiles, self.color))
 
     def __repr__(self) -> str:
-        return "Tetrominoe(" + repr(self.tiles) + ", " + repr(self.color) + ")"
+        return "Tetrominoe(" + repr(list(self.tiles)) + ", " + repr(self.color) + ")"
 
     def __str__(self) -> str:
-        """Creates a string representation of the current tile"""
-        cur_tile = self.tile()
+        """Creates a string representation of the original tile"""
+        return _tile_str(self.frame_buffer())
+
+    def tile(self, rotation: int = 0) -> Tile:
+        """Returns the Tile of a rotation"""
+        return self.tiles[rotation]
+
+    def frame_buffer(self, rotation: int = 0) -> "FrameBuffer":
+        """The cells of the Tile of a rotation in a new frame buffer"""
+        tile = self.tiles[rotation]
+        frame = FrameBuffer(tile.width, tile.height)
+        code = CODES[self.color]
+        for row, mask in enumerate(tile.rowmasks):
+            for col in range(tile.width):
+                if mask >> col & 1:
+                    frame.cells[row * tile.width + col] = code
+        return frame
 
-        tile_board = [
-            "".join([self.color + " " if cell else "  " for cell in line])
-            for line in cur_tile.array
-        ]
+    def orginal(self) -> Tile:
+        """Get the original face of the Tetrominoe"""
+        return self.tiles[0]
+
+    @property
+    def width(self):
+        """Obtain the width of the original face"""
+        return self.tiles[0].width
+
+    @property
+    def height(self):
+        """Obtain the height of the original face"""
+        return self.tiles[0].height
 
-        strrep = "\n".join(tile_board)
 
-        return strrep
+def tile_line(colors: str) -> str:
+    """One row of a tile as drawn by Tetrominoe.__str__, two characters
+    per cell"""
+    return "".join([color + " " if color != " " else "  " for color in colors])
+
+
+def _tile_str(frame: "FrameBuffer") -> str:
+    """Draws the frame buffer of a tile"""
+    return "\n".join(tile_line(frame.colors(row)) for row in range(frame.height))
+
+
+class ActivePiece:
+    """The falling tetrominoe of a game and its rotation, the only part
+    of a piece that a game changes"""
+
+    __slots__ = ("tetrominoe", "rotation")
+
+    def __init__(self, tetrominoe: Tetrominoe, rotation: int = 0):
+        self.tetrominoe = tetrominoe
+        self.rotation = rotation
+
+    def __eq__(self, rhs) -> bool:
+        if not isinstance(rhs, ActivePiece):
+            return False
+        return self.tetrominoe is rhs.tetrominoe and self.rotation == rhs.rotation
+
+    def __repr__(self) -> str:
+        return f"ActivePiece({self.tetrominoe!r}, {self.rotation})"
+
+    def __str__(self) -> str:
+        """Creates a string representation of the current tile"""
+        return _tile_str(self.tetrominoe.frame_buffer(self.rotation))
+
+    @property
+    def tiles(self) -> Tuple[Tile, ...]:
+        """All faces of the tetrominoe"""
+        return self.tetrominoe.tiles
+
+    @property
+    def color(self) -> str:
+        """The colour of the tetrominoe"""
+        return self.tetrominoe.color
 
     def tile(self) -> Tile:
-        """Returns a tuple with the list that holds the current Tile"""
-        return self.tiles[self.rotation]
+        """Returns the Tile of the current rotation"""
+        return self.tetrominoe.tiles[self.rotation]
 
     def rotate_right(self) -> None:
         """Rotate the Tetrominoe to the right"""
-        self.rotation = (self.rotation + 1) % len(self.tiles)
+        self.rotation = (self.rotation + 1) % len(self.tetrominoe.tiles)
 
     def rotate_left(self) -> None:
         """Rotate the Tetromminoe to the left"""
-        self.rotation = self.rotation - 1
-        if self.rotation < 0:
-            self.rotation = len(self.tiles) - 1
-
-    def reset(self) -> None:
-        """Resets rotation to orgin"""
-        self.rotation = 0
-
-    def orginal(self) -> Tile:
-        """Get the original face of the Tetrominoe"""
-        return self.tiles[0]
+        self.rotation = (self.rotation - 1) % len(self.tetrominoe.tiles)
 
     @property
     def width(self):
         """Obtain the width given the current rotation"""
-        return self.tiles[self.rotation].width
+        return self.tetrominoe.tiles[self.rotation].width
 
     @property
     def height(self):
         """Obtain the height given the current rotation"""
-        return self.tiles[self.rotation].height
+        return self.tetrominoe.tiles[self.rotation].height
 
 
 # Turn off black to improve readabilty
@@ -267,131 +376,529 @@ MES = Tetrominoe([MES1, MES2], "R")
 
 # fmt: on
 
+TETROMINOES = (LINE, MEL, EL, CUBE, ES, TABLE, MES)
+
+
+DEFAULT_HEIGHT = 20
+DEFAULT_WIDTH = 10
+
+# Marks the cells where the current tetrominoe would land
+GHOST = "."
+
+# Points for clearing 1, 2, 3 or 4 lines at once, multiplied by level + 1
+LINE_SCORES = (40, 100, 300, 1200)
+
+# Colour of the garbage rows that the opponent sends in versus mode
+GARBAGE = "X"
+
+# Garbage rows sent to the opponent for clearing 1, 2, 3 or 4 lines at once
+GARBAGE_LINES = (0, 1, 2, 4)
+
+# The colour of every cell code, a frame buffer holds the codes
+COLORS = " " + "".join(tetrominoe.color for tetrominoe in TETROMINOES) + GARBAGE + GHOST
+CODES = {color: code for code, color in enumerate(COLORS)}
+EMPTY = CODES[" "]
+_COLOR_TABLE = bytes.maketrans(bytes(range(len(COLORS))), COLORS.encode())
+
 
-_DEF_HEIGHT = 20
-_DEF_WIDTH = 10
+class FrameBuffer:
+    """The cells of a board or a tile as colour codes, row after row in
+    one preallocated bytearray. dirty holds the rows that changed since
+    the reader last took them, other readers get their own set from
+    add_reader."""
+
+    __slots__ = ("width", "height", "cells", "dirty", "readers")
+
+    def __init__(self, width: int, height: int):
+        self.width, self.height = width, height
+        self.cells = bytearray(width * height)
+        self.dirty = set(range(height))
+        self.readers: List[Set[int]] = []
+
+    def add_reader(self) -> Set[int]:
+        """A set of dirty rows for another reader, it starts with every
+        row and the reader clears it"""
+        dirty = set(range(self.height))
+        self.readers.append(dirty)
+        return dirty
+
+    def row(self, row: int) -> bytes:
+        """The codes of the cells of a row"""
+        start = row * self.width
+        return bytes(self.cells[start : start + self.width])
+
+    def colors(self, row: int) -> str:
+        """The colours of the cells of a row, one character per cell"""
+        return self.row(row).translate(_COLOR_TABLE).decode()
+
+    def take_dirty(self) -> List[int]:
+        """The dirty rows from the top to the bottom, afterwards no row
+        is dirty"""
+        rows = sorted(self.dirty)
+        self.dirty.clear()
+        return rows
+
+
+def board_line(colors: str) -> str:
+    """One row of a board as drawn by Tetris.__str__"""
+    return "|" + "!".join(colors) + "|"
+
+
+class Action(IntEnum):
+    """The actions a player may take, used by Tetris.step"""
+
+    LEFT = 0
+    RIGHT = 1
+    DOWN = 2
+    ROTATE = 3
+    DROP = 4
+    QUIT = 5
+
+
+class Events(NamedTuple):
+    """What happened during one Tetris.step or Tetris.tick"""
+
+    locked: bool
+    lines_cleared: int
+    game_over: bool
+
+
+# Tetrominoes in one chunk of a _PieceSequence
+_CHUNK_SIZE = 256
+
+
+class _PieceSequence:
+    """The tetrominoes that a generator produces, drawn when they are
+    first needed. They are kept in chunks, every chunk links to the next
+    one. A game and its clones and snapshots share the chunks, but each
+    only keeps the chunk of its current tetrominoe, so the chunks that
+    none of them needs any more are freed."""
+
+    __slots__ = ("_rng", "_start", "_pieces", "_next")
+
+    def __init__(self, rng: r.Random, start: int = 0):
+        self._rng = rng
+        self._start = start  # index of the first tetrominoe of the chunk
+        self._pieces: List[Tetrominoe] = []
+        self._next: Optional[_PieceSequence] = None
+
+    def seek(self, index: int) -> "_PieceSequence":
+        """The chunk that holds index, which isn't before this chunk"""
+        chunk = self
+        while index >= chunk._start + _CHUNK_SIZE:
+            if chunk._next is None:
+                # The generator draws the tetrominoes in order
+                chunk[chunk._start + _CHUNK_SIZE - 1]
+                chunk._next = _PieceSequence(chunk._rng, chunk._start + _CHUNK_SIZE)
+            chunk = chunk._next
+        return chunk
+
+    def __getitem__(self, index: int) -> Tetrominoe:
+        chunk = self.seek(index)
+        pieces = chunk._pieces
+        while len(pieces) <= index - chunk._start:
+            pieces.append(chunk._rng.choice(TETROMINOES))
+        return pieces[index - chunk._start]
+
+
+class Snapshot(NamedTuple):
+    """The state of a game at one moment, made by Tetris.snapshot. The
+    rows are immutable, so they are shared with the game and with other
+    snapshots instead of copied."""
+
+    board: Tuple[bytes, ...]
+    rows: Tuple[int, ...]
+    row_fill: Tuple[int, ...]
+    tops: Tuple[int, ...]
+    col_holes: Tuple[int, ...]
+    holes: int
+    sequence: _PieceSequence
+    piece_index: int
+    rotation: int
+    tet_width: int
+    tet_height: int
+    game_over: bool
+    score: int
+    num_successive: int
+    lines: int
+    pieces: int
+    fall_counter: int
+    frames: int
+    level: int
+    garbage_out: int
+    garbage: Tuple[int, ...]
 
 
 class Tetris:
     """Basic playing board for playing tetris"""
 
-    styles = ["NTSC", "PAL"]
-
-    def __init__(self, width=_DEF_WIDTH, height=_DEF_HEIGHT, style="NTSC"):
-        if style not in Tetris.styles:
+    styles = list(CURVES)
+
+    __slots__ = (
+        "width",
+        "height",
+        "_curve",
+        "_style",
+        "seed",
+        "_sequence",
+        "_piece_index",
+        "current",
+        "next",
+        "tet_height",
+        "tet_width",
+        "_board",
+        "_frame",
+        "_lines",
+        "_stale",
+        "_painted",
+        "_rows",
+        "_full_row",
+        "_row_fill",
+        "_tops",
+        "_col_holes",
+        "_holes",
+        "game_over",
+        "ghost",
+        "_score",
+        "_num_successive",
+        "lines",
+        "pieces",
+        "_fall_counter",
+        "frames",
+        "_level",
+        "_fall_frames",
+        "_fall_duration",
+        "_line_scores",
+        "garbage_out",
+        "_garbage",
+    )
+
+    def __init__(
+        self,
+        width=DEFAULT_WIDTH,
+        height=DEFAULT_HEIGHT,
+        style="NTSC",
+        seed=None,
+        ghost=False,
+    ):
+        """Style is one of the styles or a custom SpeedCurve"""
+        if isinstance(style, SpeedCurve):
+            self._curve = style
+        elif style in CURVES:
+            self._curve = CURVES[style]
+        else:
             raise ValueError(f"style should be one of {Tetris.styles}")
+        if width < 4 or height < 4:
+            raise ValueError("The board should be at least 4 * 4")
         self.width, self.height = width, height
-        self._style = style
-        self._tetrominoes = [LINE, MEL, EL, CUBE, ES, TABLE, MES]
-        self.current = copy.deepcopy(r.choice(self._tetrominoes))
-        self.next = copy.deepcopy(r.choice(self._tetrominoes))
+        self._style = self._curve.name
+        # Every game has its own generator, so a seed reproduces a game
+        self.seed = seed
+        self._sequence = _PieceSequence(r.Random(seed))
+        self._piece_index = 0  # of the current tetrominoe in the sequence
+        self.current = ActivePiece(self._sequence[0])
+        self.next = self._sequence[1]
         self.tet_height = 0
         # Used as index, hence use integer division
         self.tet_width = self.width // 2 - self.current.width // 2
-        self._board = [
-            [" " for column in range(self.width)] for row in range(self.height)
-        ]
+        # The colour layer, used for rendering only. The rows hold cell
+        # codes in bytes, so snapshots can share them.
+        self._board = [bytes(self.width)] * self.height
+        self._init_frame()
+        # The occupation layer, each row is a bitmask of occupied columns
+        self._rows = [0] * self.height
+        self._full_row = (1 << self.width) - 1
+        # Statistics that are updated when a tetrominoe locks
+        self._row_fill = [0] * self.height
+        self._tops = [self.height] * self.width  # highest occupied row
+        self._col_holes = [0] * self.width
+        self._holes = 0
         self.game_over = False
+        self.ghost = ghost  # whether __str__ shows the ghost piece
         self._score = 0
         self._num_successive = 0
         self.lines = 0
-
-    def _paint_current(self, board: List[List[str]]) -> None:
-        """Paint the current in the board. Board maybe a copy
-        or self._board, in the latter case the state of the Tetris window
-        is updated"""
+        self.pieces = 0
+        self._fall_counter = 0  # frames since the tetrominoe fell
+        self.frames = 0
+        self._set_level(0)
+        # Versus mode, garbage rows to send and holes of the received rows
+        self.garbage_out = 0
+        self._garbage: List[int] = []
+
+    def _paint_current(
+        self, board: List[List[str]], height: Optional[int] = None, color=None
+    ) -> None:
+        """Paint the current in a copy of the board. Height and color
+        default to those of the current tetrominoe."""
         tile = self.current.tile()
+        if height is None:
+            height = self.tet_height
+        if color is None:
+            color = self.current.color
 
         for row in range(tile.height):
             for col in range(tile.width):
                 copy_col = self.tet_width + col
-                copy_row = self.tet_height + row
+                copy_row = height + row
                 if tile.array[row][col]:
-                    board[copy_row][copy_col] = self.current.color
+                    board[copy_row][copy_col] = color
 
-    def __str__(self) -> str:
-        """Return a string repr of self"""
-        ret = "".join(["-" for row in range(self.width * 2 + 1)]) + "\n"
+    def _lock_current(self) -> None:
+        """Store the current tetrominoe in both the colour and the
+        occupation layer of the board"""
+        self.pieces += 1
+        tile = self.current.tile()
+        code = CODES[self.current.color]
+        shift = self.tet_width
+        for row, mask in enumerate(tile.rowmasks, self.tet_height):
+            self._rows[row] |= mask << shift
+            self._row_fill[row] += mask.bit_count()
+            cells = bytearray(self._board[row])
+            for col in range(tile.width):
+                if mask >> col & 1:
+                    cells[shift + col] = code
+            self._board[row] = bytes(cells)
+            self._stale.add(row)
+
+        tops, col_holes = self._tops, self._col_holes
+        for col, tile_rows in enumerate(tile.colrows, shift):
+            old_top = tops[col]
+            above = [self.tet_height + row for row in tile_rows]
+            # cells below the old top fill a hole
+            filled = sum(1 for row in above if row > old_top)
+            if filled:
+                above = [row for row in above if row < old_top]
+                col_holes[col] -= filled
+                self._holes -= filled
+            if above:
+                # the gaps between the new and old top are new holes
+                new_holes = old_top - above[0] - len(above)
+                col_holes[col] += new_holes
+                self._holes += new_holes
+                tops[col] = above[0]
+
+    def _scan_column(self, col: int) -> None:
+        """Recompute the top and holes of one column from the board"""
+        bit = 1 << col
+        top = self.height
+        holes = 0
+        for row in range(self.height - 1, -1, -1):
+            if self._rows[row] & bit:
+                holes += top - row - 1
+                top = row
+        self._holes += holes - self._col_holes[col]
+        self._tops[col] = top
+        self._col_holes[col] = holes
+
+    def _recount(self) -> None:
+        """Recompute all statistics of the board, needed after the board
+        has been changed by something else than a lock"""
+        self._row_fill = [row.bit_count() for row in self._rows]
+        self._stale.update(range(self.height))
+        for col in range(self.width):
+            self._scan_column(col)
+
+    def _init_frame(self) -> None:
+        """A new frame buffer, every row is built at the next update"""
+        self._frame = FrameBuffer(self.width, self.height)
+        # The rows of __str__, None when the row has to be built again
+        self._lines: List[Optional[str]] = [None] * self.height
+        # Rows of the board that changed since the frame buffer was updated
+        self._stale = set(range(self.height))
+        # The tile, colour, position and ghost row painted in the buffer
+        self._painted: Optional[tuple] = None
+
+    def frame_buffer(self) -> FrameBuffer:
+        """The cells of the board with the current tetrominoe, and the
+        ghost when ghost is set, painted in. The game keeps one buffer,
+        only the rows that changed since the previous call are written
+        again and added to its dirty rows."""
+        tile = self.current.tile()
+        ghost_row = self.landing_row() if self.ghost else None
+        overlay = (tile, self.current.color, self.tet_width, self.tet_height, ghost_row)
+        rows = self._stale
+        painted = self._painted
+        if overlay != painted:
+            if painted is not None:
+                rows.update(_overlay_rows(painted))
+            rows.update(_overlay_rows(overlay))
+        if not rows:
+            return self._frame
+
+        frame, board, width = self._frame, self._board, self.width
+        x, y = self.tet_width, self.tet_height
+        code = CODES[self.current.color]
+        for row in rows:
+            cells = bytearray(board[row])
+            if ghost_row is not None and 0 <= row - ghost_row < tile.height:
+                _paint_row(cells, tile.rowmasks[row - ghost_row], x, CODES[GHOST])
+            if 0 <= row - y < tile.height:
+                _paint_row(cells, tile.rowmasks[row - y], x, code)
+            start = row * width
+            if frame.cells[start : start + width] != cells:
+                frame.cells[start : start + width] = cells
+                frame.dirty.add(row)
+                for dirty in frame.readers:
+                    dirty.add(row)
+                self._lines[row] = None
+        rows.clear()
+        self._painted = overlay
+        return frame
+
+    def cells(self, ghost: bool = False) -> List[List[str]]:
+        """The colour of every cell of the board with the current
+        tetrominoe painted in, a new list that may be changed"""
         copy = self._copy_board()
-
-        # "paint" current in copy of board
+        if ghost:
+            self._paint_current(copy, self.landing_row(), GHOST)
         self._paint_current(copy)
+        return copy
 
-        for row in copy:
-            dotted_row = [char + "!" for char in row]
-            dotted_row[-1] = dotted_row[-1][0]  # strip trailing .
-            ret += "".join(["|", "".join(dotted_row), "|\n"])
-        ret += "".join(["-" for row in range(self.width * 2 + 1)])
-        return ret
+    def __str__(self) -> str:
+        """Return a string repr of self, a view of the frame buffer. Only
+        the rows that changed are built again, so the cost doesn't grow
+        with the area of the board."""
+        frame = self.frame_buffer()
+        lines = self._lines
+        for row, line in enumerate(lines):
+            if line is None:
+                lines[row] = board_line(frame.colors(row))
+        bar = "-" * (self.width * 2 + 1)
+        return "\n".join([bar, *lines, bar])
 
     def _copy_board(self) -> List[List[str]]:
         """Returns a temporary copy of the board"""
-        copy = [[line[i] for i in range(len(line))] for line in self._board]
-        return copy
+        return [list(row.translate(_COLOR_TABLE).decode()) for row in self._board]
 
     def _setup_new(self):
         """Use the next tetrominoe and compute new next"""
-        self.current = self.next
-        self.next = copy.deepcopy(r.choice(self._tetrominoes))
+        self._piece_index += 1
+        self._sequence = self._sequence.seek(self._piece_index)
+        self.current = ActivePiece(self.next)
+        self.next = self._sequence[self._piece_index + 1]
         self.tet_height = 0
         self.tet_width = self.width // 2 - self.current.width // 2
+        self._fall_counter = 0
         if self._collision():
             self.game_over = True
 
     def _collision(self) -> bool:
         """Computes whether the current state represents a collision"""
-        if self.tet_width < 0:  # collison with left wall
-            return True
-        if (
-            self.tet_width + self.current.width > self.width
-        ):  # collision with right wall
-            return True
-        if self.tet_height + self.current.height > self.height:
+        # This runs for every move, so it avoids property and method calls
+        current = self.current
+        tile = current.tetrominoe.tiles[current.rotation]
+        x = self.tet_width
+        brow = self.tet_height
+        # collision with the left wall, the right wall or the bottom
+        if x < 0 or x + tile.width > self.width or brow + tile.height > self.height:
             return True
 
-        tile = self.current.tile()
-        for row in range(tile.height):
-            for col in range(tile.width):
-                bcol = self.tet_width + col  # indices on the board
-                brow = self.tet_height + row
-                if tile.array[row][col] and self._board[brow][bcol] != " ":
-                    return True
+        rows = self._rows
+        for mask in tile.rowmasks:
+            if rows[brow] & (mask << x):
+                return True
+            brow += 1
         return False
 
     def _is_row_full(self, row) -> bool:
         """Checks whether the row is full"""
-        if " " in self._board[row]:
-            return False
-        return True
+        return self._rows[row] == self._full_row
+
+    def _set_level(self, level: int) -> None:
+        """Look up the speed and the scores of a level, they are only
+        computed again when the level changes"""
+        self._level = level
+        self._fall_frames = self._curve.frames(level)
+        self._fall_duration = self._fall_frames * self._curve.frame_duration
+        self._line_scores = tuple(points * (level + 1) for points in LINE_SCORES)
 
     def _calc_score(self, num_lines: int) -> int:
         """Compute the score for a number of lines cleared"""
         if not 0 < num_lines <= 4:
             raise ValueError("Num lines must be one of: [1,2,3,4]")
-        scores = [40, 100, 300, 1200]
-        return scores[num_lines - 1] * (self.level + 1)
+        return self._line_scores[num_lines - 1]
 
-    def _check_score(self):
+    def _check_score(self, rows: Optional[Iterable[int]] = None):
         """Checks the whether some rows are complete. Updates
-        the score and board accordingly.
+        the score and board accordingly. When rows is given, only
+        those rows are checked.
         """
-        collection = [row for row in range(len(self._board)) if self._is_row_full(row)]
+        if rows is None:
+            rows = range(len(self._board))
+        collection = {row for row in rows if self._is_row_full(row)}
         assert 0 <= len(collection) <= 4
         self.lines += len(collection)
 
         if not collection:
             return
 
+        if self.lines // 10 != self._level:
+            self._set_level(self.lines // 10)
+
         self._score += self._calc_score(len(collection))
+        self.garbage_out += GARBAGE_LINES[len(collection) - 1]
+
+        # clear full lines, from the bottom up so the indices of the rows
+        # that are still to be cleared don't change
+        cleared = sorted(collection)
+        for row in reversed(cleared):
+            del self._board[row]
+            del self._rows[row]
+            del self._row_fill[row]
+        # and insert empty lines at the top
+        num = len(cleared)
+        self._board[0:0] = [bytes(self.width)] * num
+        self._rows[0:0] = [0] * num
+        self._row_fill[0:0] = [0] * num
+        # every row above the lowest cleared one moved
+        self._stale.update(range(cleared[-1] + 1))
+
+        # A row moves down by the number of cleared rows below it. Full
+        # rows have no holes, so only a column whose top was cleared
+        # changes: the empty cells down to its next block were holes and
+        # are now above its top.
+        rows, tops, col_holes = self._rows, self._tops, self._col_holes
+        highest = cleared[0]
+        for col, top in enumerate(tops):
+            if top < highest:
+                tops[col] = top + num
+                continue
+            row = top + num - bisect_left(cleared, top)
+            bit = 1 << col
+            while row < self.height and not rows[row] & bit:
+                row += 1
+                col_holes[col] -= 1
+                self._holes -= 1
+            tops[col] = row
 
-        # clear full lines
-        self._board = [
-            row for index, row in enumerate(self._board) if index not in collection
-        ]
-        # create a set of empty lines
-        empty = [[" " for col in range(self.width)] for row in range(len(collection))]
-        # concat empty lines and board with full lines removed
-        self._board = empty + self._board
+    @property
+    def column_heights(self) -> Tuple[int, ...]:
+        """The height of the highest occupied cell of every column,
+        0 for an empty column"""
+        return tuple(self.height - top for top in self._tops)
+
+    @property
+    def row_fills(self) -> Tuple[int, ...]:
+        """The number of occupied cells of every row, from the top to
+        the bottom"""
+        return tuple(self._row_fill)
+
+    @property
+    def holes(self) -> int:
+        """The number of empty cells below the top of their column"""
+        return self._holes
+
+    @property
+    def rows(self) -> Tuple[int, ...]:
+        """The occupied cells of the board, one bitmask per row from the
+        top to the bottom, bit n is set when column n is occupied"""
+        return tuple(self._rows)
+
+    @property
+    def style(self) -> str:
+        """The NES this game emulates, one of Tetris.styles"""
+        return self._style
 
     @property
     def score(self) -> int:
@@ -401,39 +908,113 @@ class Tetris:
     @property
     def level(self) -> int:
         """Get the current level"""
-        return self.lines // 10
+        return self._level
+
+    @property
+    def speed_curve(self) -> SpeedCurve:
+        """The speed curve of the style"""
+        return self._curve
+
+    @property
+    def frame_duration(self) -> float:
+        """The duration of one frame of the emulated NES"""
+        return self._curve.frame_duration
+
+    @property
+    def fall_frames(self) -> int:
+        """Returns the number of frames it takes to fall one row"""
+        return self._fall_frames
 
     @property
     def fall_duration(self) -> float:
         """Returns the duration when the block should fall for one level"""
-        if self._style == "NTSC":
-            num_frames = nd.NTSC_NF_DESCENT[self.level]
-            return num_frames * (1 / nd.NTSC_FPS)
-        elif self._style == "PAL":
-            num_frames = nd.PAL_NF_DESCENT[self.level]
-            return num_frames * (1 / nd.PAL_FPS)
-        else:
-            raise ValueError("Unexpected/unhandled value encountered")
+        return self._fall_duration
+
+    @property
+    def frames_until_fall(self) -> int:
+        """The number of frames until gravity pulls the tetrominoe down"""
+        return max(1, self._fall_frames - self._fall_counter)
+
+    def frame(self) -> Optional[Events]:
+        """Advance one NES frame. Returns the events of the gravity tick
+        or None when the tetrominoe didn't fall during this frame."""
+        self.frames += 1
+        self._fall_counter += 1
+        if self._fall_counter < self._fall_frames:
+            return None
+        self._fall_counter = 0
+        return self.tick()
 
     def increment(self) -> None:
         """Make the tetrominoe advance one position"""
         self.tet_height += 1
         if self._collision():
             self.tet_height -= 1
-            self._paint_current(self._board)
-            self._check_score()
+            self._lock_current()
+            self._check_score(
+                range(self.tet_height, self.tet_height + self.current.height)
+            )
+            if self._garbage:
+                self._raise_garbage()
             self._setup_new()
 
+    def add_garbage(self, holes: Iterable[int]) -> None:
+        """Queue garbage rows from the opponent, each row is full except
+        for the column of its hole. They are pushed in from the bottom
+        when the current tetrominoe locks."""
+        self._garbage.extend(holes)
+
+    def _raise_garbage(self) -> None:
+        """Push the queued garbage rows in from the bottom, blocks that are
+        pushed out at the top end the game"""
+        holes = self._garbage[-self.height :]
+        self._garbage = []
+        num = len(holes)
+        if any(self._rows[:num]):
+            self.game_over = True
+        self._rows = self._rows[num:] + [
+            self._full_row & ~(1 << hole) for hole in holes
+        ]
+        garbage = CODES[GARBAGE]
+        self._board = self._board[num:] + [
+            bytes([garbage] * hole + [EMPTY] + [garbage] * (self.width - hole - 1))
+            for hole in holes
+        ]
+        self._recount()  # garbage is rare, a full recount is fine
+
+    def landing_row(self) -> int:
+        """The row where the current tetrominoe would come to rest when
+        dropped. When the tetrominoe is above the surface of the board
+        this only looks at the column heights and the bottom of the tile."""
+        tile = self.current.tile()
+        tops = self._tops
+        x, y = self.tet_width, self.tet_height
+        landing = self.height
+        for col, bottom in enumerate(tile.bottoms):
+            top = tops[x + col]
+            if y + bottom >= top:
+                return self._scan_landing_row()
+            landing = min(landing, top - bottom - 1)
+        return landing
+
+    def _scan_landing_row(self) -> int:
+        """Find the landing row by moving the tile down row by row, needed
+        when the tetrominoe is tucked below an overhang"""
+        tile = self.current.tile()
+        masks = [mask << self.tet_width for mask in tile.rowmasks]
+        rows = self._rows
+        y = self.tet_height
+        while y + tile.height < self.height:
+            if any(rows[y + 1 + row] & mask for row, mask in enumerate(masks)):
+                break
+            y += 1
+        return y
+
     def drop(self) -> None:
         """drop the tetrominoe as far to the bottom as possible"""
-        last_height = self.tet_height
-        log.info("dropping")
-        while True:
-            self.increment()
-            log.debug(f"last_height = {last_height}, tet_height={self.tet_height}")
-            if last_height >= self.tet_height:
-                break
-            last_height = self.tet_height
+        self.tet_height = self.landing_row()
+        log.debug("dropping to %d", self.tet_height)
+        self.increment()
 
     def move_left(self) -> None:
         """Moves the current tetrominoe to the left if it
@@ -459,17 +1040,143 @@ class Tetris:
         """Marks the game Game Over"""
         self.game_over = True
 
-    @staticmethod
-    def str_width():
+    def step(self, action: Action) -> Events:
+        """Perform one action and report what happened, this doesn't
+        depend on curses or the wall clock, so games can be simulated
+        as fast as possible. A game that is over doesn't change."""
+        if self.game_over:
+            return Events(False, 0, True)
+        pieces, lines = self.pieces, self.lines
+        _STEP_ACTIONS[action](self)
+        return Events(self.pieces != pieces, self.lines - lines, self.game_over)
+
+    def tick(self) -> Events:
+        """Let gravity pull the tetrominoe one row down"""
+        return self.step(Action.DOWN)
+
+    def snapshot(self) -> Snapshot:
+        """The state of the game, the rows are shared and not copied"""
+        return Snapshot(
+            tuple(self._board),
+            tuple(self._rows),
+            tuple(self._row_fill),
+            tuple(self._tops),
+            tuple(self._col_holes),
+            self._holes,
+            self._sequence,
+            self._piece_index,
+            self.current.rotation,
+            self.tet_width,
+            self.tet_height,
+            self.game_over,
+            self._score,
+            self._num_successive,
+            self.lines,
+            self.pieces,
+            self._fall_counter,
+            self.frames,
+            self._level,
+            self.garbage_out,
+            tuple(self._garbage),
+        )
+
+    def restore(self, snapshot: Snapshot) -> None:
+        """Return to the state of a snapshot of this game or of a game
+        with the same size"""
+        if len(snapshot.rows) != self.height or len(snapshot.tops) != self.width:
+            raise ValueError("The snapshot is of a board of another size")
+        # Rows that are shared with the snapshot didn't change
+        self._stale.update(
+            row
+            for row, (old, new) in enumerate(zip(self._board, snapshot.board))
+            if old is not new
+        )
+        self._board = list(snapshot.board)
+        self._rows = list(snapshot.rows)
+        self._row_fill = list(snapshot.row_fill)
+        self._tops = list(snapshot.tops)
+        self._col_holes = list(snapshot.col_holes)
+        self._holes = snapshot.holes
+        self._sequence = snapshot.sequence
+        self._piece_index = snapshot.piece_index
+        self.current = ActivePiece(
+            snapshot.sequence[snapshot.piece_index], snapshot.rotation
+        )
+        self.next = snapshot.sequence[snapshot.piece_index + 1]
+        self.tet_width = snapshot.tet_width
+        self.tet_height = snapshot.tet_height
+        self.game_over = snapshot.game_over
+        self._score = snapshot.score
+        self._num_successive = snapshot.num_successive
+        self.lines = snapshot.lines
+        self.pieces = snapshot.pieces
+        self._fall_counter = snapshot.fall_counter
+        self.frames = snapshot.frames
+        if snapshot.level != self._level:
+            self._set_level(snapshot.level)
+        self.garbage_out = snapshot.garbage_out
+        self._garbage = list(snapshot.garbage)
+
+    def clone(self) -> "Tetris":
+        """An independent copy of the game that shares its rows"""
+        game = Tetris.__new__(Tetris)
+        game.width, game.height = self.width, self.height
+        game._curve = self._curve
+        game._style = self._style
+        game.seed = self.seed
+        game.ghost = self.ghost
+        game._full_row = self._full_row
+        game._board = [bytes(game.width)] * game.height
+        game._init_frame()
+        game._level = -1  # restore sets the level
+        game.restore(self.snapshot())
+        return game
+
+    def __copy__(self) -> "Tetris":
+        return self.clone()
+
+    def __deepcopy__(self, _memo) -> "Tetris":
+        return self.clone()
+
+    def str_width(self) -> int:
         """Calculates the width of the __str___ representation"""
         side_bars = 2
-        columns = 10
+        columns = self.width
         num_dots = columns - 1
         return side_bars + columns + num_dots
 
-    @staticmethod
-    def str_height():
+    def str_height(self) -> int:
         """Calculates the height of the __str___ representation"""
         bars = 2
-        rows = 20
+        rows = self.height
         return bars + rows
+
+
+def _overlay_rows(overlay: tuple) -> Iterable[int]:
+    """The rows that the tetrominoe and ghost of an overlay cover"""
+    tile, _color, _x, y, ghost_row = overlay
+    rows = range(y, y + tile.height)
+    if ghost_row is None:
+        return rows
+    return [*rows, *range(ghost_row, ghost_row + tile.height)]
+
+
+def _paint_row(cells: bytearray, mask: int, x: int, code: int) -> None:
+    """Set the cells of the columns of mask, shifted by x, to code"""
+    col = x
+    while mask:
+        if mask & 1:
+            cells[col] = code
+        mask >>= 1
+        col += 1
+
+
+# Indexed by Action
+_STEP_ACTIONS = (
+    Tetris.move_left,
+    Tetris.move_right,
+    Tetris.increment,
+    Tetris.rotate,
+    Tetris.drop,
+    Tetris.set_game_over,
+)
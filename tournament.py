@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""Play many seeded bot games on all cores and tune the bot's weights"""
+
+import argparse as ap
+import os
+import random as r
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from bot import Bot, Weights
+from tetris import Tetris
+
+
+def play_game(job: Tuple[Tuple[float, ...], int, int, bool]) -> Dict[str, int]:
+    """Let the bot play one game, the game ends at game over or after
+    max_pieces. Runs in a worker process."""
+    weights, seed, max_pieces, lookahead = job
+    tgame = Tetris(seed=seed)
+    bot = Bot(Weights(*weights), lookahead)
+    while not tgame.game_over and tgame.pieces < max_pieces:
+        bot.play(tgame)
+    return {
+        "seed": seed,
+        "score": tgame.score,
+        "lines": tgame.lines,
+        "level": tgame.level,
+        "pieces": tgame.pieces,
+    }
+
+
+def summarize(results: Iterable[Dict[str, int]]) -> Dict[str, float]:
+    """Mean, median, min and max of score, lines and level"""
+    results = list(results)
+    summary: Dict[str, float] = {"games": len(results)}
+    for key in ("score", "lines", "level"):
+        values = [result[key] for result in results]
+        summary[f"mean_{key}"] = statistics.fmean(values)
+        summary[f"median_{key}"] = statistics.median(values)
+        summary[f"min_{key}"] = min(values)
+        summary[f"max_{key}"] = max(values)
+    return summary
+
+
+class Tournament:
+    """Spreads bot games over a pool of worker processes"""
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_pieces: int = 500,
+        lookahead: bool = False,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pieces = max_pieces
+        self.lookahead = lookahead
+        self._pool = ProcessPoolExecutor(self.workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        self._pool.shutdown()
+
+    def play(
+        self, candidates: Sequence[Weights], seeds: Sequence[int]
+    ) -> List[List[Dict[str, int]]]:
+        """Play every seed with every weight vector, returns the results
+        per weight vector"""
+        jobs = [
+            (tuple(weights), seed, self.max_pieces, self.lookahead)
+            for weights in candidates
+            for seed in seeds
+        ]
+        # Large chunks keep the overhead of sending jobs to the workers low
+        chunksize = max(1, len(jobs) // (self.workers * 4))
+        results = list(self._pool.map(play_game, jobs, chunksize=chunksize))
+        return [
+            results[index : index + len(seeds)]
+            for index in range(0, len(results), len(seeds))
+        ]
+
+    def cross_entropy(
+        self,
+        generations: int,
+        population: int,
+        seeds: Sequence[int],
+        elite: float = 0.2,
+        start: Weights = Weights(),
+        spread: float = 0.5,
+        rng: Optional[r.Random] = None,
+        verbose: bool = False,
+    ) -> Tuple[Weights, float]:
+        """Tune the weights with the cross entropy method: sample weight
+        vectors around a mean, keep the elite and move the mean and the
+        spread towards them. Returns the best weights and their mean
+        number of lines."""
+        rng = rng or r.Random()
+        means = list(start)
+        stdevs = [spread] * len(means)
+        num_elite = max(2, int(population * elite))
+        best, best_lines = start, float("-inf")
+
+        for generation in range(generations):
+            candidates = [
+                Weights(*(rng.gauss(mean, stdev) for mean, stdev in zip(means, stdevs)))
+                for _ in range(population)
+            ]
+            scored = sorted(
+                (
+                    (summarize(results)["mean_lines"], weights)
+                    for weights, results in zip(
+                        candidates, self.play(candidates, seeds)
+                    )
+                ),
+                key=lambda item: item[0],
+                reverse=True,
+            )
+            if scored[0][0] > best_lines:
+                best_lines, best = scored[0]
+            elites = [weights for _lines, weights in scored[:num_elite]]
+            means = [statistics.fmean(values) for values in zip(*elites)]
+            stdevs = [statistics.stdev(values) + 0.01 for values in zip(*elites)]
+            if verbose:
+                print(
+                    f"generation {generation}: best = {scored[0][0]:.1f} lines, "
+                    f"mean = {Weights(*means)}"
+                )
+        return best, best_lines
+
+
+def main():
+    """Evaluate or tune the weights of the bot"""
+    cmdparser = ap.ArgumentParser(
+        "tournament", "Play many bot games of Tetᴙis in parallel"
+    )
+    cmdparser.add_argument(
+        "-w", "--workers", type=int, help="number of processes, defaults to all cores"
+    )
+    cmdparser.add_argument(
+        "-n", "--games", type=int, default=100, help="games per weight vector"
+    )
+    cmdparser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    cmdparser.add_argument(
+        "--max-pieces", type=int, default=500, help="maximum number of pieces per game"
+    )
+    cmdparser.add_argument(
+        "--lookahead", action="store_true", help="let the bot look at the next piece"
+    )
+    cmdparser.add_argument(
+        "--tune",
+        type=int,
+        metavar="GENERATIONS",
+        help="tune the weights with the cross entropy method",
+    )
+    cmdparser.add_argument(
+        "--population", type=int, default=50, help="weight vectors per generation"
+    )
+    args = cmdparser.parse_args()
+
+    seeds = range(args.seed, args.seed + args.games)
+    with Tournament(args.workers, args.max_pieces, args.lookahead) as tournament:
+        start = time.perf_counter()
+        if args.tune:
+            best, lines = tournament.cross_entropy(
+                args.tune, args.population, seeds, rng=r.Random(args.seed), verbose=True
+            )
+            print(f"best = {best}, mean lines = {lines:.1f}")
+            num_games = args.tune * args.population * args.games
+        else:
+            (results,) = tournament.play([Weights()], seeds)
+            for key, value in summarize(results).items():
+                print(f"{key} = {value:g}")
+            num_games = args.games
+        duration = time.perf_counter() - start
+
+    print(f"workers = {tournament.workers}, duration = {duration:.3f}s")
+    print(f"games/s = {num_games / duration:.1f}")
+
+
+if __name__ == "__main__":
+    main()
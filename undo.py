@@ -0,0 +1,38 @@
+"""A bounded history of game states for undoing moves"""
+
+from collections import deque
+from typing import Deque
+
+from tetris import Snapshot, Tetris
+
+
+class UndoHistory:
+    """Snapshots of a game, only the newest max_size are kept. The rows
+    of the board are shared between the snapshots and the game, so a
+    snapshot costs about one pointer per row and column."""
+
+    def __init__(self, tgame: Tetris, max_size: int = 100):
+        self.tgame = tgame
+        self._snapshots: Deque[Snapshot] = deque(maxlen=max_size)
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+    def save(self) -> None:
+        """Remember the current state of the game"""
+        self._snapshots.append(self.tgame.snapshot())
+
+    def undo(self, steps: int = 1) -> bool:
+        """Drop the newest steps snapshots and return to the state of the
+        last one that was dropped. Returns False, without changing
+        anything, when there are fewer snapshots."""
+        if steps < 1 or len(self._snapshots) < steps:
+            return False
+        for _ in range(steps):
+            snapshot = self._snapshots.pop()
+        self.tgame.restore(snapshot)
+        return True
+
+    def clear(self) -> None:
+        """Forget all snapshots"""
+        self._snapshots.clear()
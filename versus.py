@@ -0,0 +1,266 @@
+"""Two player versus mode, two games talk over a local TCP or Unix socket.
+
+Every message starts with a header holding its type and the length of
+its payload. A game only sends the rows of its board that changed since
+its previous message, with every cell packed in 4 bits, so a move takes a
+few dozen bytes. Clearing lines sends garbage rows to the opponent, each
+with a hole in a random column.
+"""
+
+import os
+import random as r
+import socket
+import stat
+import struct
+from typing import List, Optional, Set, Tuple
+
+from tetris import COLORS, CODES, EMPTY, GHOST, FrameBuffer, Tetris
+
+_MAGIC = b"ATV2"
+_HEADER = struct.Struct("<BI")  # type, length of the payload
+_HELLO = struct.Struct("<4sQHH")  # magic, seed, width, height
+_STATE = struct.Struct("<IIHB")  # score, lines, level, game over
+_ROW = struct.Struct("<H")  # index of a changed row, followed by its cells
+_HOLE = struct.Struct("<H")
+
+# Message types
+_HELLO_MSG = 0
+_ROWS_MSG = 1
+_GARBAGE_MSG = 2
+_STATE_MSG = 3
+
+# Every cell is sent as its 4 bit code, the ghost isn't sent
+_SENT_CODES = bytes.maketrans(bytes([CODES[GHOST]]), bytes([EMPTY]))
+
+
+def _pack_row(codes: bytes) -> bytes:
+    """Two cells per byte, the first one in the high nibble"""
+    codes = codes.translate(_SENT_CODES)
+    if len(codes) % 2:
+        codes += bytes([EMPTY])
+    return bytes(codes[i] << 4 | codes[i + 1] for i in range(0, len(codes), 2))
+
+
+def _unpack_row(data: bytes, width: int) -> List[str]:
+    """The inverse of _pack_row"""
+    row = []
+    for byte in data:
+        row.append(COLORS[byte >> 4])
+        row.append(COLORS[byte & 0xF])
+    return row[:width]
+
+
+def _address(address: str) -> Tuple[int, object]:
+    """The socket family and address of host:port or a Unix socket path"""
+    if "/" in address:
+        return socket.AF_UNIX, address
+    host, _, port = address.rpartition(":")
+    return socket.AF_INET, (host or "localhost", int(port))
+
+
+def _remove_stale_socket(path: str) -> None:
+    """Remove the socket file left behind by an earlier game, other files
+    are kept, binding to them fails"""
+    try:
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            _unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class Peer:
+    """The connection to the opponent. Its board, score and state are
+    updated by receive, the own game is sent by send."""
+
+    def __init__(self, sock: socket.socket, width: int, height: int):
+        self._sock = sock
+        if sock.family != socket.AF_UNIX:
+            # Moves are tiny, don't wait to combine them into larger packets
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setblocking(False)
+        self.width, self.height = width, height
+        self._in = bytearray()
+        self._out = bytearray()
+        # The frame buffer of the own game and its rows that weren't sent
+        self._frame: Optional[FrameBuffer] = None
+        self._dirty: Set[int] = set()
+        self._sent_state: Optional[bytes] = None
+        self._rng = r.Random()
+        # The opponent
+        self.rows = [[" "] * width for _ in range(height)]
+        self.score = 0
+        self.lines = 0
+        self.level = 0
+        self.game_over = False
+        self.disconnected = False  # left before the game was over
+        self.closed = False
+
+    def close(self) -> None:
+        """Close the connection"""
+        self._sock.close()
+        self.closed = True
+
+    def _queue(self, msg_type: int, payload: bytes) -> None:
+        self._out += _HEADER.pack(msg_type, len(payload))
+        self._out += payload
+
+    def _flush(self) -> None:
+        """Send as much of the queued messages as the socket takes"""
+        while self._out and not self.closed:
+            try:
+                sent = self._sock.send(self._out)
+            except BlockingIOError:
+                return
+            except OSError:
+                self.closed = True
+                return
+            del self._out[:sent]
+
+    def send(self, tgame: Tetris) -> None:
+        """Send the rows that changed since the previous call, the state
+        when it changed and the garbage of the cleared lines"""
+        rows = bytearray()
+        frame = tgame.frame_buffer()
+        if frame is not self._frame:
+            self._frame = frame
+            self._dirty = frame.add_reader()
+        for index in sorted(self._dirty):
+            rows += _ROW.pack(index)
+            rows += _pack_row(frame.row(index))
+        self._dirty.clear()
+        if rows:
+            self._queue(_ROWS_MSG, bytes(rows))
+
+        if tgame.garbage_out:
+            holes = [self._rng.randrange(tgame.width) for _ in range(tgame.garbage_out)]
+            tgame.garbage_out = 0
+            self._queue(_GARBAGE_MSG, b"".join(_HOLE.pack(hole) for hole in holes))
+
+        state = _STATE.pack(tgame.score, tgame.lines, tgame.level, tgame.game_over)
+        if state != self._sent_state:
+            self._sent_state = state
+            self._queue(_STATE_MSG, state)
+        self._flush()
+
+    def receive(self, tgame: Tetris) -> bool:
+        """Handle the messages of the opponent without blocking, garbage
+        is queued in tgame. Returns whether the opponent changed."""
+        self._flush()
+        changed = False
+        while not self.closed:
+            try:
+                data = self._sock.recv(65536)
+            except BlockingIOError:
+                break
+            except OSError:
+                data = b""
+            if not data:  # the opponent is gone
+                self.closed = True
+                break
+            self._in += data
+        while len(self._in) >= _HEADER.size:
+            msg_type, length = _HEADER.unpack_from(self._in)
+            end = _HEADER.size + length
+            if len(self._in) < end:
+                break
+            payload = bytes(self._in[_HEADER.size : end])
+            del self._in[:end]
+            changed |= self._handle(msg_type, payload, tgame)
+        if self.closed and not self.game_over:
+            self.game_over = self.disconnected = True
+            changed = True
+        return changed
+
+    def _handle(self, msg_type: int, payload: bytes, tgame: Tetris) -> bool:
+        """Apply one message, returns whether the opponent changed"""
+        if msg_type == _ROWS_MSG:
+            row_size = _ROW.size + (self.width + 1) // 2
+            for offset in range(0, len(payload), row_size):
+                (index,) = _ROW.unpack_from(payload, offset)
+                self.rows[index] = _unpack_row(
+                    payload[offset + _ROW.size : offset + row_size], self.width
+                )
+            return True
+        if msg_type == _GARBAGE_MSG:
+            tgame.add_garbage(hole for (hole,) in _HOLE.iter_unpack(payload))
+            return False
+        if msg_type == _STATE_MSG:
+            self.score, self.lines, self.level, game_over = _STATE.unpack(payload)
+            self.game_over = bool(game_over)
+            return True
+        raise ValueError(f"unknown message type {msg_type}")
+
+    def __str__(self) -> str:
+        """The board of the opponent, drawn like Tetris.__str__, followed
+        by its score"""
+        bar = "-" * (self.width * 2 + 1)
+        lines = [bar]
+        lines.extend("|" + "!".join(row) + "|" for row in self.rows)
+        lines.append(bar)
+        lines.append(f"Opponent: {self.score}")
+        if self.game_over:
+            lines.append("Disconnected" if self.disconnected else "Game over")
+        return "\n".join(lines)
+
+
+def _read_exactly(sock: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise RuntimeError("The opponent closed the connection")
+        data += chunk
+    return data
+
+
+def listen(address: str, tgame: Tetris) -> Peer:
+    """Wait for the opponent to connect and tell it the seed and size of
+    the game, so both games get the same tetrominoes"""
+    family, addr = _address(address)
+    with socket.socket(family, socket.SOCK_STREAM) as server:
+        if family == socket.AF_INET:
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        else:
+            _remove_stale_socket(addr)
+        try:
+            server.bind(addr)
+        except OSError as error:
+            raise RuntimeError(f"Can't listen on {address}: {error}") from error
+        try:
+            server.listen(1)
+            sock, _ = server.accept()
+        finally:
+            if family == socket.AF_UNIX:
+                _unlink(addr)
+    payload = _HELLO.pack(_MAGIC, tgame.seed, tgame.width, tgame.height)
+    sock.sendall(_HEADER.pack(_HELLO_MSG, len(payload)) + payload)
+    return Peer(sock, tgame.width, tgame.height)
+
+
+def connect(address: str) -> Tuple[Peer, int]:
+    """Connect to a listening opponent, returns the peer and the seed of
+    the game. The size of the game is stored in the peer."""
+    family, addr = _address(address)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.connect(addr)
+        msg_type, length = _HEADER.unpack(_read_exactly(sock, _HEADER.size))
+        if msg_type != _HELLO_MSG or length != _HELLO.size:
+            raise RuntimeError(f"{address} isn't a Tetᴙis game")
+        magic, seed, width, height = _HELLO.unpack(_read_exactly(sock, length))
+        if magic != _MAGIC:
+            raise RuntimeError(f"{address} isn't a Tetᴙis game")
+    except OSError as error:
+        sock.close()
+        raise RuntimeError(f"Can't connect to {address}: {error}") from error
+    except RuntimeError:
+        sock.close()
+        raise
+    return Peer(sock, width, height), seed